@@ -1,4 +1,7 @@
 import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
@@ -6,14 +9,24 @@ from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from dotenv import load_dotenv
 
+from app.core.profiling import span
+
 load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# bcrypt runs in a dedicated pool so it never blocks the event loop; requests beyond
+# HASH_MAX_PENDING queued or running hashes are rejected with 429
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "2"))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "16"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -22,6 +35,50 @@ def get_password_hash(password: str) -> str:
     """Generate password hash"""
     return pwd_context.hash(password)
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when the hash uses deprecated settings (e.g. fewer bcrypt rounds)"""
+    return pwd_context.needs_update(hashed_password)
+
+def _timed_hashing(operation: str, func, *args):
+    """Runs on a hash pool thread; records bcrypt time without the time spent queued"""
+    from app.core.metrics import observe_password_hash
+
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        observe_password_hash(operation, time.perf_counter() - start)
+
+async def _run_hashing(operation: str, func, *args):
+    """Run a bcrypt call on the hash pool, shedding load once the queue is full"""
+    global _hash_pending
+    if _hash_pending >= HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many authentication requests, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        with span(f"bcrypt.{operation}"):
+            return await loop.run_in_executor(_hash_executor, _timed_hashing, operation, func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash without blocking the event loop"""
+    return await _run_hashing("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate password hash without blocking the event loop"""
+    return await _run_hashing("hash", get_password_hash, password)
+
+def hash_pool_stats() -> dict:
+    """Size and queue depth of the bcrypt pool, reported by /api/limits"""
+    return {"workers": HASH_WORKERS, "pending": _hash_pending, "max_pending": HASH_MAX_PENDING}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -37,7 +94,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def verify_token(token: str):
     """Verify JWT token"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("jwt.decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(
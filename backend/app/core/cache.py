@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "3600"))
+# Larger images are streamed from GridFS; only their file document is cached
+IMAGE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("IMAGE_CACHE_MAX_ENTRY_BYTES", str(1024 * 1024)))
+
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+# Build the principal from the token's uid/username/role claims and skip the lookup entirely
+TRUST_TOKEN_ROLE = os.getenv("TRUST_TOKEN_ROLE", "false").lower() == "true"
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    LRU cache with per-entry TTL and a total size budget.
+    Entry size is measured by `sizer` (1 per entry by default), so the budget can be
+    a byte count for blobs or an entry count for small records. Concurrent misses for
+    the same key share a single load through get_or_load.
+    """
+
+    def __init__(self, max_size: int, ttl: float, sizer: Optional[Callable[[Any], int]] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizer = sizer or (lambda value: 1)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: dict = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry and mark it most recently used"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Insert or replace an entry, evicting least recently used entries over budget"""
+        size = self.sizer(value)
+        if size > self.max_size:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (value, size, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._size += size
+
+        while self._size > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry without touching LRU order or the hit/miss counters"""
+        entry = self._entries.get(key)
+        if entry is None or entry[2] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def keys(self) -> list:
+        return list(self._entries)
+
+    def invalidate(self, key: Hashable):
+        """Drop an entry and detach any in-flight load so it cannot repopulate it"""
+        self._inflight.pop(key, None)
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._inflight.clear()
+        self._entries.clear()
+        self._size = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value or run `loader` once for all concurrent callers.
+        A loader result of None is returned but not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._load_done(key, t))
+        else:
+            self.coalesced += 1
+
+        # Shield so a cancelled caller does not cancel the load shared with others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        # Only store the result if the key was not invalidated while loading
+        if value is not None and self._inflight.get(key) is asyncio.current_task():
+            self.set(key, value)
+        return value
+
+    def _load_done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved; callers receive it through the shield
+            task.exception()
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self._size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "inflight": len(self._inflight),
+        }
+
+def _image_entry_size(entry: dict) -> int:
+    # Blob bytes plus a rough allowance for the file document and bookkeeping
+    return len(entry.get("data") or b"") + 512
+
+# Hot images keyed by image id string; entries are {"file_doc": dict, "data": bytes | None}
+image_cache = TTLCache(IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_TTL_SECONDS, sizer=_image_entry_size)
+
+# Authenticated principals keyed by token subject (email)
+user_cache = TTLCache(USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
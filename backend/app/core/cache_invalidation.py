@@ -0,0 +1,212 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
+
+from app.core.cache import image_cache, user_cache
+from app.core.database import IMAGE_BUCKET_NAME, get_database
+from app.core.disk_cache import disk_image_cache
+
+load_dotenv()
+
+# auto: change streams, polling when the server is a standalone mongod; changestream, poll or off
+CACHE_INVALIDATION_MODE = os.getenv("CACHE_INVALIDATION_MODE", "auto").lower()
+CACHE_INVALIDATION_POLL_SECONDS = float(os.getenv("CACHE_INVALIDATION_POLL_SECONDS", "5"))
+CHANGE_STREAM_RETRY_SECONDS = float(os.getenv("CHANGE_STREAM_RETRY_SECONDS", "5"))
+CHANGE_STREAM_MAX_AWAIT_MS = 1000
+RECONCILE_BATCH_SIZE = 1000
+
+# Server error codes
+NOT_REPLICA_SET = 40573
+CHANGE_STREAM_FATAL = 280
+CHANGE_STREAM_HISTORY_LOST = 286
+
+IMAGE_COLLECTIONS = (f"{IMAGE_BUCKET_NAME}.files", "images")
+# Events after which nothing cached can be trusted
+FULL_INVALIDATION_EVENTS = ("drop", "rename", "dropDatabase", "invalidate")
+
+# Resume token of this process's stream. It is not persisted: a restarted worker's caches
+# match no stored position, so it reconciles them instead (see watch_changes)
+_resume_token = None
+
+stats = {
+    "mode": None,
+    "events": 0,
+    "full_invalidations": 0,
+    "errors": 0,
+    "last_event_at": None,
+}
+
+def _pipeline() -> list:
+    return [
+        {"$match": {"$or": [
+            {"ns.coll": "templates"},
+            # Inserted users and images cannot be cached yet
+            {"ns.coll": {"$in": ["users", *IMAGE_COLLECTIONS]}, "operationType": {"$in": ["update", "replace", "delete"]}},
+            {"operationType": {"$in": list(FULL_INVALIDATION_EVENTS)}},
+        ]}},
+        # Keep events small; the looked up user document is only needed for its email
+        {"$project": {
+            "operationType": 1,
+            "ns": 1,
+            "documentKey": 1,
+            "fullDocument.email": 1,
+            "updateDescription.updatedFields.email": 1,
+        }},
+    ]
+
+async def invalidate_templates():
+    from app.core import response_cache
+
+    await response_cache.response_cache.invalidate_local()
+
+async def invalidate_all():
+    """Forget everything cached in this process and drop deleted images from disk"""
+    stats["full_invalidations"] += 1
+    image_cache.clear()
+    user_cache.clear()
+    await invalidate_templates()
+    db = await get_database()
+    await reconcile_images(db)
+
+async def apply_change(change: dict):
+    """Invalidate what one change stream event makes stale in this process"""
+    stats["events"] += 1
+    stats["last_event_at"] = datetime.now(timezone.utc).isoformat()
+    operation = change["operationType"]
+    collection = (change.get("ns") or {}).get("coll")
+
+    if operation in FULL_INVALIDATION_EVENTS:
+        await invalidate_all()
+    elif collection == "templates":
+        await invalidate_templates()
+    elif collection == "users":
+        email = (change.get("fullDocument") or {}).get("email")
+        changed_email = "email" in ((change.get("updateDescription") or {}).get("updatedFields") or {})
+        if email and not changed_email:
+            user_cache.invalidate(email)
+        else:
+            # Deleted users are only known by id, renamed ones by their new email
+            user_cache.clear()
+    elif collection in IMAGE_COLLECTIONS:
+        image_id = str(change["documentKey"]["_id"])
+        image_cache.invalidate(image_id)
+        if operation == "delete":
+            disk_image_cache.invalidate(image_id)
+
+async def watch_changes(db):
+    """
+    Apply change stream events until the stream ends. Within a process the stream resumes
+    after the last event seen. A fresh stream reconciles the disk image cache, which
+    outlives restarts, once it is open, so no change falls between the check and the stream.
+    """
+    global _resume_token
+    resume_after = _resume_token
+
+    try:
+        async with db.watch(
+            _pipeline(),
+            full_document="updateLookup",
+            resume_after=resume_after,
+            max_await_time_ms=CHANGE_STREAM_MAX_AWAIT_MS
+        ) as stream:
+            if resume_after is None:
+                await reconcile_images(db)
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None:
+                    await apply_change(change)
+                    if change["operationType"] == "invalidate":
+                        # The stream cannot be resumed past an invalidate; start over
+                        _resume_token = None
+                        return
+                _resume_token = stream.resume_token
+    except OperationFailure as e:
+        if resume_after is not None and e.code in (CHANGE_STREAM_HISTORY_LOST, CHANGE_STREAM_FATAL):
+            print(f"Change stream cannot resume ({e}); invalidating all caches")
+            _resume_token = None
+            await invalidate_all()
+            return
+        raise
+
+async def _fingerprints(db) -> dict:
+    latest = await db.templates.find({}, {"updated_at": 1}).sort("updated_at", -1).limit(1).to_list(length=1)
+    return {
+        "templates": (await db.templates.estimated_document_count(), latest[0].get("updated_at") if latest else None),
+        "users": await db.users.estimated_document_count(),
+        "images": tuple([await db[c].estimated_document_count() for c in IMAGE_COLLECTIONS]),
+    }
+
+async def poll_changes(db):
+    """
+    Fallback for servers without change streams: compare cheap fingerprints of each
+    collection every CACHE_INVALIDATION_POLL_SECONDS. Inserts, deletes and template
+    updates are detected; other user and image updates age out with the cache TTLs.
+    """
+    previous = await _fingerprints(db)
+    # Disk cache entries may predate this process
+    await reconcile_images(db)
+    while True:
+        await asyncio.sleep(CACHE_INVALIDATION_POLL_SECONDS)
+        current = await _fingerprints(db)
+        if current["templates"] != previous["templates"]:
+            stats["events"] += 1
+            await invalidate_templates()
+        if current["users"] != previous["users"]:
+            stats["events"] += 1
+            user_cache.clear()
+        if current["images"] != previous["images"]:
+            stats["events"] += 1
+            await reconcile_images(db)
+        if current != previous:
+            stats["last_event_at"] = datetime.now(timezone.utc).isoformat()
+        previous = current
+
+async def reconcile_images(db):
+    """Drop cached images that no longer exist or whose file document changed"""
+    cached = set(image_cache.keys()) | set(disk_image_cache.ids())
+    ids = [ObjectId(i) for i in cached if ObjectId.is_valid(i)]
+    live = {}
+    for start in range(0, len(ids), RECONCILE_BATCH_SIZE):
+        batch = ids[start:start + RECONCILE_BATCH_SIZE]
+        for collection in IMAGE_COLLECTIONS:
+            async for doc in db[collection].find({"_id": {"$in": batch}}, {"metadata.variants": 1}):
+                live[str(doc["_id"])] = (doc.get("metadata") or {}).get("variants")
+
+    for image_id in cached:
+        if image_id not in live:
+            image_cache.invalidate(image_id)
+            disk_image_cache.invalidate(image_id)
+            continue
+        entry = image_cache.peek(image_id)
+        if entry is not None and (entry["file_doc"].get("metadata") or {}).get("variants") != live[image_id]:
+            image_cache.invalidate(image_id)
+
+async def run_cache_invalidation_forever():
+    """Keep this process's caches in step with writes made by other workers and replicas"""
+    mode = CACHE_INVALIDATION_MODE
+    while True:
+        try:
+            db = await get_database()
+            if mode == "poll":
+                stats["mode"] = "poll"
+                await poll_changes(db)
+            else:
+                stats["mode"] = "changestream"
+                await watch_changes(db)
+                continue
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if e.code == NOT_REPLICA_SET and mode == "auto":
+                print("Change streams need a replica set; polling for cache invalidation instead")
+                mode = "poll"
+                continue
+            stats["errors"] += 1
+            print(f"Cache invalidation listener failed: {e}")
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"Cache invalidation listener failed: {e}")
+        await asyncio.sleep(CHANGE_STREAM_RETRY_SECONDS)
@@ -0,0 +1,214 @@
+import gzip
+import os
+import time
+import zlib
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+from app.core.metrics import observe_compression, PRECOMPRESSED_RESPONSES
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it only gzip is offered
+    brotli = None
+
+load_dotenv()
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Smaller bodies gain little and cost a round of compressor setup
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Only text-like bodies are compressed; images and archives already are
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+# Preferred first when the client accepts several with the same q-value
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate(accept_encoding: Optional[str], available=ENCODINGS) -> Optional[str]:
+    """Pick the best content coding the client accepts, or None for identity"""
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return bool(media_type) and media_type.startswith(COMPRESSIBLE_TYPES)
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a complete body and record the ratio and time"""
+    start = time.perf_counter()
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    else:
+        # mtime=0 keeps the output identical for identical input
+        compressed = gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+    observe_compression(encoding, len(body), len(compressed), time.perf_counter() - start)
+    return compressed
+
+def precompress(body: bytes) -> Dict[str, bytes]:
+    """
+    Every representation of a body worth caching: identity plus one per supported
+    coding when the body is above COMPRESSION_MIN_BYTES.
+    """
+    variants = {"identity": body}
+    if COMPRESSION_ENABLED and len(body) >= COMPRESSION_MIN_BYTES:
+        for encoding in ENCODINGS:
+            variants[encoding] = compress(body, encoding)
+    return variants
+
+class PrecompressedResponse(Response):
+    """Response built from precompressed variants; the coding is chosen per request"""
+
+    def __init__(self, variants: Dict[str, bytes], media_type: str, headers: Optional[dict] = None):
+        self.variants = variants
+        super().__init__(content=variants["identity"], media_type=media_type, headers=headers)
+        if len(variants) > 1:
+            self.headers.add_vary_header("Accept-Encoding")
+
+    async def __call__(self, scope, receive, send):
+        encodings = tuple(e for e in self.variants if e != "identity")
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"), encodings)
+        if encoding is not None:
+            self.body = self.variants[encoding]
+            self.headers["content-encoding"] = encoding
+            self.headers["content-length"] = str(len(self.body))
+            PRECOMPRESSED_RESPONSES.labels(encoding).inc()
+        await super().__call__(scope, receive, send)
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        start = time.perf_counter()
+        if self.encoding == "br":
+            out = self._compressor.process(data) + (self._compressor.finish() if last else self._compressor.flush())
+        else:
+            out = self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+        self.seconds += time.perf_counter() - start
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        if last:
+            observe_compression(self.encoding, self.bytes_in, self.bytes_out, self.seconds)
+        return out
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text-like responses (JSON, NDJSON, text) with brotli
+    or gzip, as negotiated through Accept-Encoding. Responses below minimum_size,
+    non-text types such as images, partial content and responses that already carry
+    a Content-Encoding (e.g. PrecompressedResponse) are sent unchanged. Streamed
+    bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if state["passthrough"]:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_length = headers.get("content-length")
+                if (
+                    message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))
+                    or (content_length is not None and int(content_length) < self.minimum_size)
+                ):
+                    state["passthrough"] = True
+                    await send(message)
+                    return
+                # Hold the start until the first body chunk shows how large the body is
+                state["start"] = message
+                return
+
+            if message["type"] != "http.response.body":
+                # e.g. http.response.pathsend: nothing to compress
+                state["passthrough"] = True
+                await send(state["start"])
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers["content-encoding"] = encoding
+                if more_body:
+                    del headers["content-length"]
+                    state["compressor"] = _StreamCompressor(encoding)
+                else:
+                    body = compress(body, encoding)
+                    headers["content-length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    state["passthrough"] = True
+                    return
+                await send(start)
+
+            await send({
+                "type": "http.response.body",
+                "body": state["compressor"].chunk(body, last=not more_body),
+                "more_body": more_body,
+            })
+
+        await self.app(scope, receive, send_wrapper)
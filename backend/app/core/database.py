@@ -1,57 +1,361 @@
+import asyncio
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+import hashlib
+from typing import AsyncIterator, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
 from dotenv import load_dotenv
 import certifi
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 load_dotenv()
 
 MONGODB_URL = os.getenv("MONGODB_URL")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "template_sharing_db")
+# GridFS bucket holding image blobs (collections <name>.files and <name>.chunks)
+IMAGE_BUCKET_NAME = os.getenv("IMAGE_BUCKET_NAME", "image_files")
+VERIFY_QUERY_PLANS = os.getenv("VERIFY_QUERY_PLANS", "false").lower() == "true"
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+# Connection pool, per worker process: total connections = workers x MONGO_MAX_POOL_SIZE
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = _optional_int("MONGO_MAX_IDLE_TIME_MS")
+# How long an operation may wait for a free pooled connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = _optional_int("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+# Connections opened at startup; defaults to MONGO_MIN_POOL_SIZE (at least one ping)
+MONGO_POOL_WARMUP = int(os.getenv("MONGO_POOL_WARMUP", str(MONGO_MIN_POOL_SIZE)))
 
 class Database:
     client: AsyncIOMotorClient = None
     database = None
+    # Process that created the client; a forked worker must not reuse its parent's pool
+    pid: Optional[int] = None
 
 db = Database()
 
+_connect_lock = asyncio.Lock()
+
+def client_options() -> dict:
+    """Keyword arguments for AsyncIOMotorClient built from the MONGO_* settings"""
+    from app.core.metrics import METRICS_ENABLED, mongo_command_metrics, mongo_pool_metrics
+    from app.core.profiling import PROFILING_ENABLED, profiling_command_listener
+
+    options = {
+        "tlsCAFile": certifi.where(),
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "event_listeners": [mongo_pool_metrics],
+    }
+    if METRICS_ENABLED:
+        options["event_listeners"].append(mongo_command_metrics)
+    if PROFILING_ENABLED:
+        options["event_listeners"].append(profiling_command_listener)
+    if MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = MONGO_MAX_IDLE_TIME_MS
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    return options
+
+def _needs_connection() -> bool:
+    return db.database is None or db.pid != os.getpid()
+
+def use_database(client, database):
+    """Install an already created client and database for this process (benchmarks, tests)"""
+    db.client = client
+    db.database = database
+    db.pid = os.getpid()
+
 async def get_database() -> AsyncIOMotorClient:
-    if db.database is None:
+    if _needs_connection():
         await connect_to_mongo()
     return db.database
 
 async def connect_to_mongo():
-    """Create database connection"""
-    db.client = AsyncIOMotorClient(
-        MONGODB_URL,
-        tlsCAFile=certifi.where(),
-        serverSelectionTimeoutMS=5000,
-        connectTimeoutMS=10000,
-        socketTimeoutMS=20000
+    """Create the database connection once per process; concurrent callers share it"""
+    async with _connect_lock:
+        if not _needs_connection():
+            return
+
+        db.client = AsyncIOMotorClient(MONGODB_URL, **client_options())
+        db.database = db.client[DATABASE_NAME]
+        db.pid = os.getpid()
+        print(f"Connected to MongoDB! (pid {db.pid}, maxPoolSize={MONGO_MAX_POOL_SIZE})")
+
+        await warm_pool(db.client)
+        await _prepare_database(db.database)
+
+async def warm_pool(client, connections: int = MONGO_POOL_WARMUP):
+    """Open pooled connections up front with concurrent pings, so first requests don't pay for the handshakes"""
+    try:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(max(connections, 1))))
+    except Exception as e:
+        print(f"MongoDB pool warm-up failed: {e}")
+
+async def _prepare_database(database):
+    """Apply the index registry and one-off backfills to a freshly connected database"""
+    # Imported here because the index registry refers back to this module's settings
+    from app.core.indexes import apply_indexes, verify_query_plans
+
+    try:
+        await apply_indexes(database)
+        await backfill_search_fields(database)
+    except Exception as e:
+        print(f"Could not apply indexes: {e}")
+
+    # Opt-in startup guard against hot queries falling back to collection scans
+    if VERIFY_QUERY_PLANS:
+        await verify_query_plans(database)
+
+async def backfill_search_fields(database):
+    """Populate title_lower on templates created before prefix search existed"""
+    # {"title_lower": None} also matches missing fields and is served by the title_lower index
+    await database.templates.update_many(
+        {"title_lower": None},
+        [{"$set": {"title_lower": {"$toLower": "$title"}}}]
     )
-    db.database = db.client[DATABASE_NAME]
-    print("Connected to MongoDB!")
 
 async def close_mongo_connection():
     """Close database connection"""
-    db.client.close()
+    if db.client is not None:
+        db.client.close()
+    db.client = None
+    db.database = None
+    db.pid = None
     print("Disconnected from MongoDB!")
 
 # Image storage logic
-async def store_image_in_mongo(image_bytes: bytes, filename: str, content_type: str = "image/png"):
+async def get_image_bucket() -> AsyncIOMotorGridFSBucket:
+    """Return the GridFS bucket used for image blobs"""
+    db_instance = await get_database()
+    return AsyncIOMotorGridFSBucket(db_instance, bucket_name=IMAGE_BUCKET_NAME)
+
+async def get_image_file_doc(image_id):
+    """
+    Fetch the GridFS file document of an image without touching its chunks.
+    Returns:
+        The file document (length, chunkSize, uploadDate, metadata) or None.
+    """
+    db_instance = await get_database()
+    return await db_instance[f"{IMAGE_BUCKET_NAME}.files"].find_one(
+        {"_id": image_id},
+        {"length": 1, "chunkSize": 1, "uploadDate": 1, "metadata": 1}
+    )
+
+async def open_image_stream(file_doc: dict) -> AsyncIOMotorGridOut:
+    """Open a GridFS download stream from an already fetched file document"""
+    db_instance = await get_database()
+    return AsyncIOMotorGridOut(db_instance[IMAGE_BUCKET_NAME], file_document=file_doc)
+
+async def load_image_entry(image_id, max_inline_bytes: int):
+    """
+    Load an image for serving/caching.
+    Args:
+        image_id: ObjectId of the image.
+        max_inline_bytes: Blobs up to this size are read into memory as well.
+    Returns:
+        {"file_doc": dict, "data": bytes | None}, or None if the image does not exist.
+    """
+    file_doc = await get_image_file_doc(image_id)
+    if file_doc:
+        data = None
+        if file_doc["length"] <= max_inline_bytes:
+            grid_out = await open_image_stream(file_doc)
+            data = await grid_out.read()
+        return {"file_doc": file_doc, "data": data}
+
+    # Images uploaded before the GridFS migration live in the legacy collection
+    db_instance = await get_database()
+    image_doc = await db_instance.images.find_one({"_id": image_id})
+    if not image_doc:
+        return None
+    return {
+        "file_doc": {
+            "_id": image_id,
+            "length": len(image_doc["data"]),
+            "metadata": {"content_type": image_doc.get("content_type", "image/png")}
+        },
+        "data": image_doc["data"]
+    }
+
+async def store_image_content(
+    image_bytes: bytes,
+    filename: str,
+    content_type: str = "image/png",
+    extra_metadata: Optional[dict] = None
+) -> Tuple[ObjectId, bool]:
     """
-    Store image in MongoDB 'images' collection.
+    Store image bytes in GridFS, reusing an identical original if one exists.
+    Originals are content addressed: their SHA-256 (also served as the ETag) is unique
+    among files carrying a refcount, and every reuse increments that refcount.
+    Variants (extra_metadata with parent_id) are owned by their original and never shared.
     Args:
         image_bytes: Raw image data.
         filename: Name of the image file.
         content_type: MIME type of the image.
+        extra_metadata: Additional metadata fields, e.g. variant information.
+    Returns:
+        (file ID, True if a new file was written / False if an existing one was reused)
+    """
+    sha256 = hashlib.sha256(image_bytes).hexdigest()
+    metadata = {"content_type": content_type, "sha256": sha256}
+    metadata.update(extra_metadata or {})
+    bucket = await get_image_bucket()
+
+    if "parent_id" in metadata:
+        image_id = await bucket.upload_from_stream(filename or "image", image_bytes, metadata=metadata)
+        return image_id, True
+
+    existing = await acquire_image_by_hash(sha256)
+    if existing is not None:
+        return existing, False
+
+    # Claim the hash only once the file is complete: GridFS reports a unique index
+    # violation on upload as FileExists and leaves the written chunks behind
+    image_id = await bucket.upload_from_stream(filename or "image", image_bytes, metadata=metadata)
+    return await _publish_original(image_id, sha256)
+
+async def _publish_original(image_id: ObjectId, sha256: str) -> Tuple[ObjectId, bool]:
+    """
+    Make a freshly uploaded file the reference-counted original for its hash, or drop it
+    in favour of an identical original that is already published.
+    Returns:
+        (file ID, True if image_id was published / False if an existing one was reused)
+    """
+    existing = await acquire_image_by_hash(sha256)
+    if existing is None:
+        db_instance = await get_database()
+        try:
+            await db_instance[f"{IMAGE_BUCKET_NAME}.files"].update_one(
+                {"_id": image_id},
+                {"$set": {"metadata.sha256": sha256, "metadata.refcount": 1}}
+            )
+            return image_id, True
+        except DuplicateKeyError:
+            # A concurrent upload of the same content was published first
+            existing = await acquire_image_by_hash(sha256)
+            if existing is None:
+                await delete_image_files(image_id)
+                raise
+
+    await delete_image_files(image_id)
+    return existing, False
+
+async def store_image_stream(
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    content_type: str = "image/png"
+) -> Tuple[ObjectId, bool]:
+    """
+    Store an original image from an async iterator of chunks without buffering it.
+    The chunks go straight into a GridFS upload stream while the SHA-256 is computed
+    incrementally; once the hash is known the file is either published as a new
+    reference-counted original or dropped in favour of an identical existing one.
+    Any exception raised by the iterator (e.g. a size limit) aborts the upload.
+    Returns:
+        (file ID, True if a new file was written / False if an existing one was reused)
+    """
+    digest = hashlib.sha256()
+    bucket = await get_image_bucket()
+    image_id = ObjectId()
+    grid_in = bucket.open_upload_stream_with_id(
+        image_id, filename or "image", metadata={"content_type": content_type}
+    )
+    try:
+        async for chunk in chunks:
+            digest.update(chunk)
+            await grid_in.write(chunk)
+        await grid_in.close()
+    except BaseException:
+        await grid_in.abort()
+        raise
+
+    return await _publish_original(image_id, digest.hexdigest())
+
+async def store_image_in_mongo(
+    image_bytes: bytes,
+    filename: str,
+    content_type: str = "image/png",
+    extra_metadata: Optional[dict] = None
+):
+    """
+    Store image in the GridFS image bucket (deduplicated, see store_image_content).
     Returns:
-        Inserted document ID.
+        File ID of the stored or reused image.
     """
+    image_id, _ = await store_image_content(image_bytes, filename, content_type, extra_metadata)
+    return image_id
+
+async def acquire_image_by_hash(sha256: str) -> Optional[ObjectId]:
+    """Take a reference on the original with this content hash, if any is still referenced"""
     db_instance = await get_database()
-    image_doc = {
-        "filename": filename,
-        "content_type": content_type,
-        "data": image_bytes
-    }
-    result = await db_instance["images"].insert_one(image_doc)
-    return result.inserted_id
+    existing = await db_instance[f"{IMAGE_BUCKET_NAME}.files"].find_one_and_update(
+        # $exists keeps the query on the partial unique index; $gt skips an original being released
+        {"metadata.sha256": sha256, "metadata.refcount": {"$exists": True, "$gt": 0}},
+        {"$inc": {"metadata.refcount": 1}},
+        projection={"_id": 1}
+    )
+    return existing["_id"] if existing else None
+
+async def release_image(image_id) -> bool:
+    """
+    Drop one reference to an original image, deleting it and its variants at zero.
+    The last reference is released by removing the refcount, which claims the file:
+    acquire_image_by_hash can no longer match it and its hash is free for a new upload.
+    Images stored before reference counting are left for the garbage collector.
+    Returns:
+        True if the image was deleted.
+    """
+    if isinstance(image_id, str):
+        if not ObjectId.is_valid(image_id):
+            return False
+        image_id = ObjectId(image_id)
+
+    db_instance = await get_database()
+    files = db_instance[f"{IMAGE_BUCKET_NAME}.files"]
+    while True:
+        claimed = await files.find_one_and_update(
+            {"_id": image_id, "metadata.refcount": 1},
+            {"$unset": {"metadata.refcount": ""}},
+            projection={"metadata.variants": 1}
+        )
+        if claimed is not None:
+            await delete_image_files(image_id, (claimed.get("metadata") or {}).get("variants"))
+            return True
+
+        released = await files.update_one(
+            {"_id": image_id, "metadata.refcount": {"$gt": 1}},
+            {"$inc": {"metadata.refcount": -1}}
+        )
+        if released.modified_count:
+            return False
+
+        # Neither matched: the image is not counted (anymore), or a concurrent
+        # acquire or release changed the count between the two updates
+        if await files.find_one({"_id": image_id, "metadata.refcount": {"$gt": 0}}, {"_id": 1}) is None:
+            return False
+
+async def delete_image_files(image_id: ObjectId, variants: Optional[dict] = None):
+    """Delete an original and its variants from GridFS and drop them from the image caches"""
+    from gridfs.errors import NoFile
+    from app.core.cache import image_cache
+    from app.core.disk_cache import disk_image_cache
+
+    bucket = await get_image_bucket()
+    ids = [image_id] + [ObjectId(v["id"]) for v in (variants or {}).values()]
+    for file_id in ids:
+        try:
+            await bucket.delete(file_id)
+        except NoFile:
+            pass
+        image_cache.invalidate(str(file_id))
+        disk_image_cache.invalidate(str(file_id))
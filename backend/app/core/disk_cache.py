@@ -0,0 +1,264 @@
+import asyncio
+import mimetypes
+import os
+import uuid
+from collections import Counter, OrderedDict
+from typing import Optional
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Images materialized on first serve and sent from disk afterwards; 0 disables.
+# Shared by the worker processes of a host (see WEB_CONCURRENCY)
+IMAGE_DISK_CACHE_MAX_BYTES = int(os.getenv("IMAGE_DISK_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Inside the uploads/ directory mounted at /uploads
+IMAGE_DISK_CACHE_DIR = os.getenv("IMAGE_DISK_CACHE_DIR", os.path.join("uploads", "images"))
+# Most requested images materialized at startup
+IMAGE_DISK_CACHE_WARM_COUNT = int(os.getenv("IMAGE_DISK_CACHE_WARM_COUNT", "100"))
+# How often per-image request counts are flushed to the image_stats collection
+IMAGE_STATS_FLUSH_SECONDS = float(os.getenv("IMAGE_STATS_FLUSH_SECONDS", "60"))
+# Worker processes per host, as read by uvicorn --workers; each gets an equal share of the budget
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+WORKER_DIR_PREFIX = "worker-"
+
+class DiskImageCache:
+    """
+    Write-through copy of GridFS images on the local disk, keyed by image id.
+    Each worker process owns a subdirectory (worker-<pid>) with its own index and
+    share of the byte budget, so no worker removes a file another one is serving.
+    A directory left by a stopped worker is adopted by the next worker that starts.
+    Files are written to a temporary name and renamed into place, so readers only
+    ever see complete files. The total size is bounded with LRU eviction; the index
+    is rebuilt from the directory on startup, least recently modified first.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.directory = os.path.join(root, f"{WORKER_DIR_PREFIX}{os.getpid()}")
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (filename, size)
+        self._size = 0
+        self._pending: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+            self._claim_directory()
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _claim_directory(self):
+        """Take over the directory of a worker that is no longer running, if any"""
+        if os.path.isdir(self.directory):
+            return
+        for item in os.scandir(self.root):
+            pid = item.name[len(WORKER_DIR_PREFIX):]
+            if not item.is_dir() or not item.name.startswith(WORKER_DIR_PREFIX) or not pid.isdigit():
+                continue
+            if _process_alive(int(pid)):
+                continue
+            try:
+                # Atomic; when several workers start at once only one wins each directory
+                os.rename(item.path, self.directory)
+                return
+            except OSError:
+                continue
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _load_index(self):
+        entries = []
+        for item in os.scandir(self.directory):
+            image_id, _ = os.path.splitext(item.name)
+            if not item.is_file() or not ObjectId.is_valid(image_id):
+                # Leftover temporary files from an interrupted write of this directory's worker
+                if item.is_file():
+                    os.remove(item.path)
+                continue
+            stat = item.stat()
+            entries.append((stat.st_mtime, image_id, item.name, stat.st_size))
+        for _, image_id, filename, size in sorted(entries):
+            self._files[image_id] = (filename, size)
+            self._size += size
+        self._evict()
+
+    def __contains__(self, image_id: str) -> bool:
+        return image_id in self._files
+
+    def ids(self) -> list:
+        return list(self._files)
+
+    def path(self, image_id: str) -> Optional[str]:
+        """Path of the materialized image, or None if it is not on disk"""
+        entry = self._files.get(image_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._files.move_to_end(image_id)
+        self.hits += 1
+        return os.path.join(self.directory, entry[0])
+
+    def materialize(self, entry: dict):
+        """Copy an image entry (see load_image_entry) to disk in the background, once"""
+        image_id = str(entry["file_doc"]["_id"])
+        if not self.enabled or image_id in self._files or image_id in self._pending:
+            return
+        if entry["file_doc"].get("length", 0) > self.max_bytes:
+            return
+        task = asyncio.ensure_future(self._write(image_id, entry))
+        self._pending[image_id] = task
+        task.add_done_callback(lambda t: self._write_done(image_id, t))
+
+    async def _write(self, image_id: str, entry: dict):
+        from app.core.database import open_image_stream
+        from app.utils.image_streaming import iter_grid_out
+
+        file_doc = entry["file_doc"]
+        content_type = (file_doc.get("metadata") or {}).get("content_type", "image/png")
+        filename = image_id + (mimetypes.guess_extension(content_type) or "")
+        temp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+
+        handle = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            if entry["data"] is not None:
+                await asyncio.to_thread(handle.write, entry["data"])
+            else:
+                grid_out = await open_image_stream(file_doc)
+                async for chunk in iter_grid_out(grid_out):
+                    await asyncio.to_thread(handle.write, chunk)
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(os.replace, temp_path, os.path.join(self.directory, filename))
+        except BaseException:
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(remove_file, temp_path)
+            raise
+
+        # Invalidated while writing: the bytes may belong to a deleted image
+        if self._pending.get(image_id) is not asyncio.current_task():
+            await asyncio.to_thread(remove_file, os.path.join(self.directory, filename))
+            return
+
+        size = file_doc.get("length", 0)
+        self._files[image_id] = (filename, size)
+        self._size += size
+        self.writes += 1
+        self._evict()
+
+    def _write_done(self, image_id: str, task: asyncio.Task):
+        if self._pending.get(image_id) is task:
+            del self._pending[image_id]
+        if not task.cancelled() and task.exception():
+            print(f"Could not write image {image_id} to the disk cache: {task.exception()}")
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._files:
+            image_id, (filename, size) = self._files.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            remove_file(os.path.join(self.directory, filename))
+
+    def invalidate(self, image_id: str):
+        """Remove an image from disk, e.g. after it was deleted from GridFS"""
+        self._pending.pop(image_id, None)
+        entry = self._files.pop(image_id, None)
+        if entry is not None:
+            self._size -= entry[1]
+            remove_file(os.path.join(self.directory, entry[0]))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.directory,
+            "files": len(self._files),
+            "size": self._size,
+            "max_size": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "pending": len(self._pending),
+        }
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        return True
+    return True
+
+disk_image_cache = DiskImageCache(IMAGE_DISK_CACHE_DIR, IMAGE_DISK_CACHE_MAX_BYTES // WEB_CONCURRENCY)
+
+# Requests per image id since the last flush to image_stats
+_request_counts: Counter = Counter()
+
+def record_image_request(image_id: str):
+    _request_counts[image_id] += 1
+
+async def flush_image_stats():
+    """Add the buffered request counts to image_stats, one upsert per image"""
+    from pymongo import UpdateOne
+    from app.core.database import get_database
+
+    if not _request_counts:
+        return
+    counts = dict(_request_counts)
+    _request_counts.clear()
+    db = await get_database()
+    await db.image_stats.bulk_write(
+        [UpdateOne({"_id": image_id}, {"$inc": {"hits": hits}}, upsert=True) for image_id, hits in counts.items()],
+        ordered=False
+    )
+
+async def warm_disk_cache(count: int = IMAGE_DISK_CACHE_WARM_COUNT) -> int:
+    """
+    Materialize the most requested images that are not on disk yet.
+    Returns:
+        Number of images that were scheduled.
+    """
+    from app.core.database import get_database, load_image_entry
+
+    if not disk_image_cache.enabled or count <= 0:
+        return 0
+    db = await get_database()
+    scheduled = 0
+    async for stat in db.image_stats.find({}, {"_id": 1}).sort("hits", -1).limit(count):
+        image_id = stat["_id"]
+        if image_id in disk_image_cache or not ObjectId.is_valid(image_id):
+            continue
+        # Nothing is kept in memory: the file is streamed from GridFS to disk
+        entry = await load_image_entry(ObjectId(image_id), 0)
+        if entry is not None:
+            disk_image_cache.materialize(entry)
+            scheduled += 1
+    return scheduled
+
+async def run_image_stats_forever(interval: float = IMAGE_STATS_FLUSH_SECONDS):
+    """Background loop for the FastAPI lifespan: warm the disk cache, then flush counts"""
+    try:
+        print(f"Warming image disk cache with {await warm_disk_cache()} images")
+    except Exception as e:
+        print(f"Image disk cache warm-up failed: {e}")
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_image_stats()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Image stats flush failed: {e}")
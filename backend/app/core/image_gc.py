@@ -0,0 +1,143 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Set
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from app.core.database import get_database, delete_image_files, IMAGE_BUCKET_NAME
+
+load_dotenv()
+
+# 0 disables the in-process sweeper started from the FastAPI lifespan
+IMAGE_GC_INTERVAL_SECONDS = float(os.getenv("IMAGE_GC_INTERVAL_SECONDS", "0"))
+IMAGE_GC_DRY_RUN = os.getenv("IMAGE_GC_DRY_RUN", "false").lower() == "true"
+IMAGE_GC_BATCH_SIZE = int(os.getenv("IMAGE_GC_BATCH_SIZE", "50"))
+# Pause between delete batches so the sweeper never competes with foreground traffic
+IMAGE_GC_BATCH_PAUSE_SECONDS = float(os.getenv("IMAGE_GC_BATCH_PAUSE_SECONDS", "1"))
+# Images younger than this may belong to an upload whose template is not written yet
+IMAGE_GC_GRACE_SECONDS = float(os.getenv("IMAGE_GC_GRACE_SECONDS", "3600"))
+
+REPORT_SAMPLE_SIZE = 100
+
+async def referenced_image_ids(db) -> Set[str]:
+    """Image ids referenced by any template, via image_id or the image URL of older documents"""
+    referenced = set()
+    async for template in db.templates.find({}, {"image_id": 1, "image_url": 1}).batch_size(1000):
+        if template.get("image_id"):
+            referenced.add(str(template["image_id"]))
+        image_url = template.get("image_url") or ""
+        if "/api/images/" in image_url:
+            referenced.add(image_url.rsplit("/", 1)[-1])
+    return referenced
+
+async def collect_orphaned_images(
+    dry_run: bool = True,
+    batch_size: int = IMAGE_GC_BATCH_SIZE,
+    batch_pause: float = IMAGE_GC_BATCH_PAUSE_SECONDS,
+    grace_seconds: float = IMAGE_GC_GRACE_SECONDS
+) -> dict:
+    """
+    Find images that no template references and, unless dry_run, delete them in batches.
+    Covers GridFS originals (with their variants), variants whose original is gone, and
+    legacy `images` documents.
+    Returns:
+        Report with counts, reclaimable bytes and a sample of orphaned ids.
+    """
+    db = await get_database()
+    files = db[f"{IMAGE_BUCKET_NAME}.files"]
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    referenced = await referenced_image_ids(db)
+
+    originals = set()
+    orphans = []  # (kind, id, variants, bytes, refcount)
+    async for file_doc in files.find(
+        {"metadata.parent_id": {"$exists": False}},
+        {"length": 1, "uploadDate": 1, "metadata.variants": 1, "metadata.refcount": 1}
+    ).batch_size(1000):
+        originals.add(file_doc["_id"])
+        if str(file_doc["_id"]) in referenced or _is_recent(file_doc, cutoff):
+            continue
+        metadata = file_doc.get("metadata") or {}
+        orphans.append(("original", file_doc["_id"], metadata.get("variants"), file_doc.get("length", 0), metadata.get("refcount")))
+
+    async for file_doc in files.find(
+        {"metadata.parent_id": {"$exists": True}},
+        {"length": 1, "uploadDate": 1, "metadata.parent_id": 1}
+    ).batch_size(1000):
+        if file_doc["metadata"]["parent_id"] not in originals and not _is_recent(file_doc, cutoff):
+            orphans.append(("variant", file_doc["_id"], None, file_doc.get("length", 0), None))
+
+    async for image_doc in db.images.find({}, {"_id": 1}).batch_size(1000):
+        if str(image_doc["_id"]) not in referenced:
+            orphans.append(("legacy", image_doc["_id"], None, 0, None))
+
+    report = {
+        "dry_run": dry_run,
+        "orphaned": len(orphans),
+        "orphaned_bytes": sum(o[3] for o in orphans),
+        "by_kind": {kind: sum(1 for o in orphans if o[0] == kind) for kind in ("original", "variant", "legacy")},
+        "sample_ids": [str(o[1]) for o in orphans[:REPORT_SAMPLE_SIZE]],
+        "deleted": 0,
+        "skipped": 0,
+    }
+    if dry_run:
+        return report
+
+    for start in range(0, len(orphans), batch_size):
+        for kind, image_id, variants, _, refcount in orphans[start:start + batch_size]:
+            if await _delete_orphan(db, kind, image_id, variants, refcount):
+                report["deleted"] += 1
+            else:
+                report["skipped"] += 1
+        if start + batch_size < len(orphans):
+            await asyncio.sleep(batch_pause)
+
+    return report
+
+def _is_recent(file_doc: dict, cutoff: datetime) -> bool:
+    upload_date = file_doc.get("uploadDate")
+    if upload_date is None:
+        return False
+    if upload_date.tzinfo is None:
+        upload_date = upload_date.replace(tzinfo=timezone.utc)
+    return upload_date >= cutoff
+
+async def _delete_orphan(db, kind: str, image_id: ObjectId, variants: Optional[dict], refcount) -> bool:
+    """Delete one orphan unless it gained a reference since the scan"""
+    if kind == "legacy":
+        if await db.templates.find_one({"image_id": str(image_id)}, {"_id": 1}):
+            return False
+        await db.images.delete_one({"_id": image_id})
+        return True
+
+    if kind == "variant":
+        await delete_image_files(image_id)
+        return True
+
+    if await db.templates.find_one({"image_id": str(image_id)}, {"_id": 1}):
+        return False
+    if refcount is not None:
+        # Claim the file by removing its refcount: a concurrent deduplicated upload either
+        # incremented it first (claim fails) or can no longer match it afterwards
+        claimed = await db[f"{IMAGE_BUCKET_NAME}.files"].update_one(
+            {"_id": image_id, "metadata.refcount": refcount},
+            {"$unset": {"metadata.refcount": ""}}
+        )
+        if claimed.modified_count == 0:
+            return False
+    await delete_image_files(image_id, variants)
+    return True
+
+async def run_image_gc_forever(interval: float = IMAGE_GC_INTERVAL_SECONDS, dry_run: bool = IMAGE_GC_DRY_RUN):
+    """Background loop for the FastAPI lifespan; errors are logged and the loop keeps going"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await collect_orphaned_images(dry_run=dry_run)
+            print(f"Image GC: {report['orphaned']} orphaned, {report['deleted']} deleted, "
+                  f"{report['skipped']} skipped (dry_run={dry_run})")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Image GC failed: {e}")
@@ -0,0 +1,100 @@
+from typing import List
+from app.core.database import IMAGE_BUCKET_NAME
+
+IMAGE_FILES = f"{IMAGE_BUCKET_NAME}.files"
+
+# Declarative index registry applied idempotently at startup by connect_to_mongo.
+# Index names are left to MongoDB's defaults so re-applying an existing index is a no-op.
+INDEXES = [
+    # Login, registration and get_current_user lookups; also rejects duplicate registrations
+    {"collection": "users", "keys": [("email", 1)], "options": {"unique": True}},
+    # Keyset pagination and exports; its created_at prefix serves created_at filters/sorts
+    {"collection": "templates", "keys": [("created_at", 1), ("_id", 1)], "options": {}},
+    {"collection": "templates", "keys": [("created_by", 1)], "options": {}},
+    {"collection": "templates", "keys": [("image_id", 1)], "options": {}},
+    # Relevance-ranked search; title matches weigh five times more than description matches
+    {
+        "collection": "templates",
+        "keys": [("title", "text"), ("description", "text")],
+        "options": {"weights": {"title": 10, "description": 2}, "default_language": "english"},
+    },
+    # Prefix/autocomplete search on the lower-cased title with anchored regexes
+    {"collection": "templates", "keys": [("title_lower", 1)], "options": {}},
+    # Latest change, polled for cache invalidation where change streams are unavailable
+    {"collection": "templates", "keys": [("updated_at", -1)], "options": {}},
+    # Bulk import checkpoints: one document per imported manifest item
+    {"collection": "import_items", "keys": [("job_id", 1), ("key", 1)], "options": {"unique": True}},
+    # Disk cache warm-up reads the most requested images
+    {"collection": "image_stats", "keys": [("hits", -1)], "options": {}},
+    # Content-addressed originals: one reference-counted file per SHA-256
+    {
+        "collection": IMAGE_FILES,
+        "keys": [("metadata.sha256", 1)],
+        "options": {"unique": True, "partialFilterExpression": {"metadata.refcount": {"$exists": True}}},
+    },
+]
+
+# Queries on the request path that must be served by an index. Each entry is
+# (collection, filter, sort); values are placeholders, only the shape matters.
+HOT_QUERIES = [
+    ("users", {"email": "probe@example.com"}, None),
+    ("templates", {}, [("created_at", 1), ("_id", 1)]),
+    ("templates", {"created_by": "probe"}, None),
+    ("templates", {"image_id": "probe"}, None),
+    ("templates", {"title_lower": {"$regex": "^probe"}}, [("title_lower", 1)]),
+    ("templates", {}, [("updated_at", -1)]),
+    ("image_stats", {}, [("hits", -1)]),
+    (IMAGE_FILES, {"metadata.sha256": "probe", "metadata.refcount": {"$exists": True, "$gt": 0}}, None),
+]
+
+async def apply_indexes(database) -> List[str]:
+    """
+    Create every registered index that does not exist yet.
+    Returns:
+        Names of the indexes as reported by MongoDB.
+    """
+    names = []
+    for spec in INDEXES:
+        try:
+            name = await database[spec["collection"]].create_index(spec["keys"], **spec["options"])
+            names.append(name)
+        except Exception as e:
+            # e.g. a unique index cannot be built while duplicates exist
+            print(f"Could not create index {spec['keys']} on {spec['collection']}: {e}")
+    return names
+
+def _plan_stages(plan) -> List[str]:
+    """Collect every `stage` in a (possibly nested) explain plan"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+async def find_collection_scans(database) -> List[str]:
+    """
+    Explain each hot query and report those whose winning plan scans the collection.
+    Returns:
+        Human readable descriptions of the offending queries (empty when all use indexes).
+    """
+    problems = []
+    for collection, query, sort in HOT_QUERIES:
+        cursor = database[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.limit(1).explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        if "COLLSCAN" in stages:
+            problems.append(f"{collection}.find({query}) sort={sort} uses COLLSCAN")
+    return problems
+
+async def verify_query_plans(database):
+    """Raise RuntimeError when any hot query falls back to a collection scan"""
+    problems = await find_collection_scans(database)
+    if problems:
+        raise RuntimeError("Hot queries are not index backed:\n  " + "\n  ".join(problems))
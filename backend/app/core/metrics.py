@@ -0,0 +1,261 @@
+import os
+import time
+from dotenv import load_dotenv
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+
+load_dotenv()
+
+# Off by default: route names, latencies and cache internals are not for the public
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+# Required by GET /metrics as `Authorization: Bearer <token>`; without one the endpoint stays closed
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+if METRICS_ENABLED and not METRICS_TOKEN:
+    print("METRICS_ENABLED is set without METRICS_TOKEN; GET /metrics will answer 404")
+
+# Seconds; request latency from a cached image hit (~1ms) up to slow uploads
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes; JSON pages are a few KB, thumbnails tens of KB, originals up to MAX_UPLOAD_BYTES
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# Compressed size over original size
+RATIO_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0)
+# Seconds; gzip/brotli of a JSON page takes well under a millisecond to a few
+COMPRESSION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+# bcrypt at the default cost takes a few hundred milliseconds
+HASH_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+# Seconds; a free pooled connection is handed out in microseconds, an exhausted pool makes
+# operations queue for up to waitQueueTimeoutMS
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time from request start to the last response byte",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+# Labelled by method only: the route template is known only once routing has run
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests currently being handled", ["method"],
+    multiprocess_mode="livesum"
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size", ["method", "route"], buckets=SIZE_BUCKETS
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips as seen by the driver",
+    ["command", "status"], buckets=LATENCY_BUCKETS
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time an operation waited for a pooled connection",
+    ["outcome"], buckets=CHECKOUT_WAIT_BUCKETS
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures", "Connection checkouts that failed, e.g. on waitQueueTimeoutMS",
+    ["reason"]
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongodb_pool_connections", "Pooled connections, open or checked out", ["state"],
+    multiprocess_mode="livesum"
+)
+MONGO_POOL_CLEARED = Counter(
+    "mongodb_pool_cleared", "Times the pool was cleared after a network error or failover"
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds", "bcrypt time on the hash pool, excluding queueing",
+    ["operation"], buckets=HASH_BUCKETS
+)
+
+COMPRESSION_RATIO = Histogram(
+    "http_response_compression_ratio", "Compressed over original body size", ["encoding"],
+    buckets=RATIO_BUCKETS
+)
+COMPRESSION_LATENCY = Histogram(
+    "http_response_compression_seconds", "CPU time spent compressing one body", ["encoding"],
+    buckets=COMPRESSION_BUCKETS
+)
+COMPRESSION_BYTES_IN = Counter(
+    "http_response_compression_input_bytes", "Body bytes before compression", ["encoding"]
+)
+COMPRESSION_BYTES_OUT = Counter(
+    "http_response_compression_output_bytes", "Body bytes after compression", ["encoding"]
+)
+PRECOMPRESSED_RESPONSES = Counter(
+    "http_responses_precompressed", "Responses served from cached compressed bytes", ["encoding"]
+)
+
+REQUESTS_REJECTED = Counter(
+    "http_requests_rejected", "Requests refused by rate limits (429) or admission control (503)",
+    ["reason", "limit"]
+)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, in-flight requests and response sizes per route.
+    Routes are labelled by their template (e.g. /api/images/{image_id}) as resolved by
+    the router, so label cardinality stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        state = {"status": 500, "size": 0, "content_length": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name == b"content-length":
+                        state["content_length"] = int(value)
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            route = route_template(scope)
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            REQUESTS.labels(method, route, str(state["status"])).inc()
+            # FileResponse bodies may be sent with pathsend, so prefer Content-Length
+            size = state["content_length"] if state["content_length"] is not None else state["size"]
+            RESPONSE_SIZE.labels(method, route).observe(size)
+
+def route_template(scope) -> str:
+    """Path template of the route that handled the request, e.g. /api/images/{image_id}"""
+    # The router stores the matched route in the (shared) scope while handling the request
+    path = getattr(scope.get("route"), "path", None)
+    if path is None:
+        return "unmatched"
+    # Routes of included routers carry their path without the include_router prefix
+    included = (scope.get("fastapi") or {}).get("included_router")
+    prefix = getattr(getattr(included, "include_context", None), "prefix", "")
+    return prefix + path
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds MONGO_COMMAND_LATENCY from the driver's command monitoring events"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "succeeded").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "failed").observe(event.duration_micros / 1e6)
+
+mongo_command_metrics = MongoCommandMetrics()
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Feeds the mongodb_pool_* metrics from the driver's CMAP events. Checkout wait grows
+    when maxPoolSize is too small for the worker's concurrency. Events arrive from driver
+    threads; prometheus_client metrics are thread safe.
+    """
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        MONGO_POOL_CLEARED.inc()
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels("open").inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels("open").dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+        MONGO_POOL_CHECKOUT_WAIT.labels("failed").observe(event.duration)
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.labels("in_use").inc()
+        MONGO_POOL_CHECKOUT_WAIT.labels("succeeded").observe(event.duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.labels("in_use").dec()
+
+mongo_pool_metrics = MongoPoolMetrics()
+
+def _samples(metric) -> list:
+    return [sample for family in metric.collect() for sample in family.samples]
+
+def mongo_pool_stats() -> dict:
+    """This process's mongodb_pool_* values, as exported at /metrics"""
+    connections = {"open": 0, "in_use": 0}
+    for sample in _samples(MONGO_POOL_CONNECTIONS):
+        connections[sample.labels["state"]] = int(sample.value)
+
+    checkouts, wait_seconds, buckets = 0, 0.0, {}
+    for sample in _samples(MONGO_POOL_CHECKOUT_WAIT):
+        if sample.labels.get("outcome") != "succeeded":
+            continue
+        if sample.name.endswith("_bucket"):
+            # Cumulative, like the exported histogram
+            buckets[f"le_{sample.labels['le']}"] = int(sample.value)
+        elif sample.name.endswith("_count"):
+            checkouts = int(sample.value)
+        elif sample.name.endswith("_sum"):
+            wait_seconds = sample.value
+
+    return {
+        "pid": os.getpid(),
+        "pools_cleared": int(sum(s.value for s in _samples(MONGO_POOL_CLEARED) if s.name.endswith("_total"))),
+        "connections_open": connections["open"],
+        "connections_in_use": connections["in_use"],
+        "checkouts": checkouts,
+        "checkout_failures": {
+            s.labels["reason"]: int(s.value) for s in _samples(MONGO_POOL_CHECKOUT_FAILURES) if s.name.endswith("_total")
+        },
+        "checkout_wait_avg_ms": round(1000 * wait_seconds / checkouts, 3) if checkouts else 0.0,
+        "checkout_wait_buckets": buckets,
+    }
+
+def observe_compression(encoding: str, bytes_in: int, bytes_out: int, seconds: float):
+    if bytes_in:
+        COMPRESSION_RATIO.labels(encoding).observe(bytes_out / bytes_in)
+    COMPRESSION_LATENCY.labels(encoding).observe(seconds)
+    COMPRESSION_BYTES_IN.labels(encoding).inc(bytes_in)
+    COMPRESSION_BYTES_OUT.labels(encoding).inc(bytes_out)
+
+def observe_password_hash(operation: str, seconds: float):
+    PASSWORD_HASH_LATENCY.labels(operation).observe(seconds)
+
+def render_metrics() -> tuple:
+    """
+    Exposition body and content type. With PROMETHEUS_MULTIPROC_DIR set (several
+    gunicorn workers) the samples of all worker processes are aggregated.
+    Returns:
+        (body bytes, content type)
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from dotenv import load_dotenv
+from pymongo import monitoring
+
+from app.core.metrics import route_template
+
+load_dotenv()
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# Fraction of requests profiled at random (0 = only requests that ask for it)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests with this header and an admin bearer token are always profiled
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile").lower().encode()
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_PROFILES = int(os.getenv("PROFILE_MAX_PROFILES", "50"))
+PROFILE_MAX_DEPTH = 64
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+_profile_ids = itertools.count(1)
+
+class RequestProfile:
+    """Stack samples and timed spans of one request"""
+
+    def __init__(self, method: str, path: str, task: asyncio.Task):
+        self.id = str(next(_profile_ids))
+        self.method = method
+        self.path = path
+        self.task = task
+        self.route = None
+        self.status = None
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.duration = None
+        self.samples: Counter = Counter()
+        self.spans = []
+        self._pending_commands = {}
+
+    def add_span(self, name: str, start: float, end: float, **attrs):
+        self.spans.append({
+            "name": name,
+            "start_ms": round(1000 * (start - self.start), 3),
+            "duration_ms": round(1000 * (end - start), 3),
+            **attrs
+        })
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(1000 * self.duration, 3) if self.duration is not None else None,
+            "samples": sum(self.samples.values()),
+        }
+
+    def to_dict(self) -> dict:
+        spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        totals = Counter()
+        for s in spans:
+            totals[s["name"].split(".")[0]] += s["duration_ms"]
+        return {
+            **self.summary(),
+            "sample_interval_ms": PROFILE_INTERVAL_MS,
+            "span_totals_ms": {name: round(total, 3) for name, total in totals.items()},
+            "spans": spans,
+        }
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed-stack format: `frame;frame;frame count` per line"""
+        root = f"{self.method} {self.route if self.route not in (None, 'unmatched') else self.path}".replace(";", ",")
+        return "\n".join(f"{root};{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+class StackSampler:
+    """
+    Samples the event loop thread every PROFILE_INTERVAL_MS while profiles are active.
+    A sample goes to the profile whose request task is running at that moment; profiled
+    requests that are suspended get the chain of coroutines they are awaiting instead,
+    so time spent waiting on MongoDB or worker pools shows up next to CPU time.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}
+        self._thread = None
+        self._loop = None
+        self._loop_thread_id = None
+
+    def start(self, profile: RequestProfile):
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+            self._active[profile.task] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, profile: RequestProfile):
+        with self._lock:
+            if self._active.get(profile.task) is profile:
+                del self._active[profile.task]
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+                loop, thread_id = self._loop, self._loop_thread_id
+            try:
+                self._sample(active, loop, thread_id)
+            except Exception:
+                # Frames and coroutines change under our feet; skip the tick
+                pass
+
+    def _sample(self, active, loop, thread_id):
+        running = asyncio.current_task(loop) if loop is not None else None
+        frame = sys._current_frames().get(thread_id)
+        for task, profile in active:
+            if task is running and frame is not None:
+                profile.samples[_frame_stack(frame)] += 1
+            else:
+                profile.samples[_await_stack(task)] += 1
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+def _frame_stack(frame) -> str:
+    frames = []
+    while frame is not None and len(frames) < PROFILE_MAX_DEPTH:
+        frames.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+def _await_stack(task: asyncio.Task) -> str:
+    frames = []
+    coro = task.get_coro()
+    while coro is not None and len(frames) < PROFILE_MAX_DEPTH:
+        code = getattr(coro, "cr_code", None) or getattr(coro, "gi_code", None) or getattr(coro, "ag_code", None)
+        if code is None:
+            frames.append(type(coro).__name__)
+            break
+        frames.append(_frame_label(code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return ";".join(frames + ["[awaiting]"])
+
+sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+profiles: deque = deque(maxlen=PROFILE_MAX_PROFILES)
+
+def get_profile(profile_id: str) -> Optional[RequestProfile]:
+    for profile in profiles:
+        if profile.id == profile_id:
+            return profile
+    return None
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a span of the current request's profile; a no-op when not profiling"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(name, start, time.perf_counter(), **attrs)
+
+class ProfilingCommandListener(monitoring.CommandListener):
+    """
+    Records MongoDB commands as spans of the profiled request that issued them.
+    Motor runs PyMongo on executor threads with a copy of the caller's context, so
+    the current profile is visible here.
+    """
+
+    def started(self, event):
+        profile = _current_profile.get()
+        if profile is not None:
+            target = event.command.get(event.command_name)
+            profile._pending_commands[event.request_id] = (
+                time.perf_counter(), target if isinstance(target, str) else None
+            )
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "failed")
+
+    def _finish(self, event, outcome: str):
+        profile = _current_profile.get()
+        if profile is None:
+            return
+        started = profile._pending_commands.pop(event.request_id, None)
+        end = time.perf_counter()
+        start = started[0] if started else end - event.duration_micros / 1e6
+        profile.add_span(
+            f"mongodb.{event.command_name}", start, end,
+            collection=started[1] if started else None, outcome=outcome
+        )
+
+profiling_command_listener = ProfilingCommandListener()
+
+def _wants_profile(scope) -> bool:
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    headers = dict(scope.get("headers") or [])
+    if PROFILE_HEADER not in headers:
+        return False
+    return _is_admin_token(headers.get(b"authorization", b"").decode("latin-1"))
+
+def _is_admin_token(authorization: str) -> bool:
+    from jose import JWTError, jwt
+    from app.core.auth import SECRET_KEY, ALGORITHM
+
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("role") == "admin"
+    except JWTError:
+        return False
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles PROFILE_SAMPLE_RATE of requests, plus requests sent
+    with the PROFILE_HEADER header by an admin. Profiled responses carry X-Profile-Id;
+    profiles are kept in memory (the last PROFILE_MAX_PROFILES) for the admin endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], asyncio.current_task())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop(profile)
+            _current_profile.reset(token)
+            profile.duration = time.perf_counter() - profile.start
+            profile.route = route_template(scope)
+            profile.task = None
+            profiles.append(profile)
@@ -0,0 +1,299 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from app.core.metrics import REQUESTS_REJECTED
+
+load_dotenv()
+
+# memory: per-process buckets, redis: buckets shared by all workers and replicas
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+# memory:// selects the per-process backend (tests, single worker)
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "templates:ratelimit:")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Buckets kept by the memory backend; the least recently used are dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Key on X-Forwarded-For instead of the socket peer. Enable behind a load balancer (e.g.
+# Render), where every request otherwise comes from the balancer's address
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+# Proxies in front of the app that append to X-Forwarded-For; the client is the address the
+# outermost of them appended, since anything further left was sent by the client itself
+RATE_LIMIT_PROXY_HOPS = max(1, int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1")))
+
+# Budgets as "<requests>/<second|minute|hour>"; the bucket holds one period's worth
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+RATE_LIMIT_REGISTER = os.getenv("RATE_LIMIT_REGISTER", "5/minute")
+RATE_LIMIT_UPLOADS = os.getenv("RATE_LIMIT_UPLOADS", "30/minute")
+RATE_LIMIT_IMPORTS = os.getenv("RATE_LIMIT_IMPORTS", "5/hour")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Requests handled at once per worker for each route class; 0 disables the cap
+ADMISSION_AUTH_CONCURRENCY = int(os.getenv("ADMISSION_AUTH_CONCURRENCY", "8"))
+ADMISSION_UPLOAD_CONCURRENCY = int(os.getenv("ADMISSION_UPLOAD_CONCURRENCY", "4"))
+ADMISSION_READ_CONCURRENCY = int(os.getenv("ADMISSION_READ_CONCURRENCY", "256"))
+# How long a request may wait for a slot before it is shed with 503
+ADMISSION_WAIT_SECONDS = float(os.getenv("ADMISSION_WAIT_SECONDS", "0.5"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+def parse_budget(budget: str) -> Tuple[int, float]:
+    """
+    Parse "<requests>/<period>".
+    Returns:
+        (bucket capacity, refill rate in tokens per second)
+    """
+    count, _, period = budget.partition("/")
+    if period not in PERIODS or not count.strip().isdigit() or int(count) <= 0:
+        raise ValueError(f"Invalid rate limit budget: {budget!r}, expected e.g. 10/minute")
+    return int(count), int(count) / PERIODS[period]
+
+class MemoryRateLimitBackend:
+    """Token buckets in this process, keyed by limit name and client"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (tokens, updated_at)
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        """
+        Take one token.
+        Returns:
+            0 if allowed, otherwise seconds until a token is available.
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+# Refill, take and expire atomically; the bucket expires once it would be full again
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+class RedisRateLimitBackend:
+    """Token buckets in Redis, shared by every worker and replica"""
+
+    def __init__(self, url: str, prefix: str = RATE_LIMIT_PREFIX):
+        # Optional dependency, only needed for the shared backend
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self._script = self.client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, capacity: int, rate: float) -> float:
+        return float(await self._script(keys=[self.prefix + key], args=[capacity, rate, time.time()]))
+
+def create_rate_limit_backend(backend: str = RATE_LIMIT_BACKEND):
+    if backend == "memory" or (backend == "redis" and RATE_LIMIT_REDIS_URL.startswith("memory://")):
+        return MemoryRateLimitBackend()
+    if backend == "redis":
+        return RedisRateLimitBackend(RATE_LIMIT_REDIS_URL)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+rate_limit_backend = create_rate_limit_backend()
+
+def set_rate_limit_backend(backend):
+    """Replace the rate limit backend (tests, benchmarks)"""
+    global rate_limit_backend
+    rate_limit_backend = backend
+
+def client_ip(headers: Headers, client) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED and headers.get("x-forwarded-for"):
+        addresses = [a.strip() for a in headers["x-forwarded-for"].split(",") if a.strip()]
+        if addresses:
+            return addresses[-min(RATE_LIMIT_PROXY_HOPS, len(addresses))]
+    return client[0] if client else "unknown"
+
+def client_key(request: Request) -> str:
+    """User id from a valid bearer token, otherwise the client IP"""
+    from jose import JWTError, jwt
+    from app.core.auth import SECRET_KEY, ALGORITHM
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            subject = payload.get("uid") or payload.get("sub")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            # Rejected by the auth dependency; limit it by address meanwhile
+            pass
+    return f"ip:{client_ip(request.headers, request.client)}"
+
+class RateLimit:
+    """
+    Dependency enforcing a token-bucket budget per client (user id or IP) on a route.
+    Requests over budget get 429 with Retry-After. If the backend fails, requests are let through.
+    Like every dependency it runs after FastAPI has received the request body, so on upload
+    routes it limits the work done per client, not the bytes sent; AdmissionMiddleware and
+    UploadSizeLimitMiddleware act before the body is read.
+
+        @router.post("/login", dependencies=[Depends(RateLimit("login", "10/minute"))])
+    """
+
+    def __init__(self, name: str, budget: str):
+        self.name = name
+        self.capacity, self.rate = parse_budget(budget)
+
+    async def __call__(self, request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        try:
+            retry_after = await rate_limit_backend.take(f"{self.name}:{client_key(request)}", self.capacity, self.rate)
+        except Exception as e:
+            print(f"Rate limit backend failed: {e}")
+            return
+        if retry_after > 0:
+            REQUESTS_REJECTED.labels("rate_limit", self.name).inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please retry later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+login_rate_limit = RateLimit("login", RATE_LIMIT_LOGIN)
+register_rate_limit = RateLimit("register", RATE_LIMIT_REGISTER)
+upload_rate_limit = RateLimit("uploads", RATE_LIMIT_UPLOADS)
+import_rate_limit = RateLimit("imports", RATE_LIMIT_IMPORTS)
+RATE_LIMITS = (login_rate_limit, register_rate_limit, upload_rate_limit, import_rate_limit)
+
+# Health probes, the Prometheus scrape and admin diagnostics are never shed: they are
+# needed most while the worker is saturated
+OPERATIONAL_PATHS = frozenset((
+    "/",
+    "/api/health",
+    "/metrics",
+    "/api/cache/stats",
+    "/api/limits",
+    "/api/db/pool",
+    "/api/cors-debug",
+    "/api/endpoints",
+))
+OPERATIONAL_PREFIXES = ("/api/profiles",)
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Admission class of a request: auth, uploads, reads, or None for uncapped"""
+    if path in OPERATIONAL_PATHS or path.startswith(OPERATIONAL_PREFIXES):
+        return None
+    if path.startswith("/api/auth/") and method == "POST":
+        return "auth"
+    if path.startswith("/api/templates") and method in ("POST", "PUT"):
+        return "uploads"
+    if method in ("GET", "HEAD"):
+        return "reads"
+    return None
+
+class AdmissionControl:
+    """Per-worker concurrency caps for each route class, shared by all middleware instances"""
+
+    def __init__(self, limits: dict, wait_seconds: float = ADMISSION_WAIT_SECONDS):
+        self.limits = {name: limit for name, limit in limits.items() if limit > 0}
+        self.wait_seconds = wait_seconds
+        self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+        self.in_flight = {name: 0 for name in self.limits}
+        self.rejected = {name: 0 for name in self.limits}
+
+    def caps(self, name: Optional[str]) -> bool:
+        return name in self._semaphores
+
+    async def acquire(self, name: str) -> bool:
+        """Take a slot, waiting up to wait_seconds. Returns False if the request should be shed."""
+        semaphore = self._semaphores[name]
+        if semaphore.locked():
+            if self.wait_seconds <= 0:
+                return self._reject(name)
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.wait_seconds)
+            except asyncio.TimeoutError:
+                return self._reject(name)
+        else:
+            await semaphore.acquire()
+        self.in_flight[name] += 1
+        return True
+
+    def release(self, name: str):
+        self.in_flight[name] -= 1
+        self._semaphores[name].release()
+
+    def _reject(self, name: str) -> bool:
+        self.rejected[name] += 1
+        REQUESTS_REJECTED.labels("overloaded", name).inc()
+        return False
+
+    def stats(self) -> dict:
+        return {
+            name: {"limit": limit, "in_flight": self.in_flight[name], "rejected": self.rejected[name]}
+            for name, limit in self.limits.items()
+        }
+
+admission_control = AdmissionControl({
+    "auth": ADMISSION_AUTH_CONCURRENCY,
+    "uploads": ADMISSION_UPLOAD_CONCURRENCY,
+    "reads": ADMISSION_READ_CONCURRENCY,
+})
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware capping concurrent requests per route class in this worker.
+    It runs before the request body is read, so a burst of uploads or logins is shed
+    with 503 and Retry-After instead of buffering bodies or queueing bcrypt work.
+    Requests wait up to ADMISSION_WAIT_SECONDS for a slot.
+    """
+
+    def __init__(self, app, control: AdmissionControl = admission_control):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope.get("method", ""), scope.get("path", "")) if scope["type"] == "http" else None
+        if not self.control.caps(name):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.control.acquire(name):
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.release(name)
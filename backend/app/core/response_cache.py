@@ -0,0 +1,212 @@
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from dotenv import load_dotenv
+
+from app.core.cache import TTLCache
+from app.core.compression import precompress
+
+load_dotenv()
+
+# memory: per-process cache, redis: shared between workers, none: disabled
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+# Upper bound on staleness for writes made by other workers when the memory backend is used
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# memory:// selects an in-process stand-in with the same semantics (tests, single worker)
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+RESPONSE_CACHE_PREFIX = os.getenv("RESPONSE_CACHE_PREFIX", "templates:responses:")
+
+# Serialized body plus the headers that belong to it (e.g. X-Next-Cursor)
+BuiltResponse = Tuple[bytes, Dict[str, str]]
+Builder = Callable[[], Awaitable[BuiltResponse]]
+# Body per content coding ("identity", "gzip", "br") plus headers
+CachedResponse = Tuple[Dict[str, bytes], Dict[str, str]]
+EntryBuilder = Callable[[], Awaitable[CachedResponse]]
+
+class MemoryResponseCache:
+    """
+    Responses cached in this process, keyed by catalog version.
+    Bumping the version makes every older entry unreachable; they age out through
+    LRU eviction or their TTL. Concurrent misses for one key share a single build.
+    """
+
+    name = "memory"
+    caches = True
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self._cache = TTLCache(max_bytes, ttl, sizer=lambda entry: sum(map(len, entry[0].values())) + 256)
+        self._version = 0
+
+    async def version(self) -> int:
+        return self._version
+
+    async def bump(self) -> int:
+        self._version += 1
+        return self._version
+
+    async def invalidate_local(self):
+        """A write was made by another process"""
+        await self.bump()
+
+    async def get_or_build(self, key: str, build: EntryBuilder) -> CachedResponse:
+        return await self._cache.get_or_load(key, build)
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "version": self._version, **self._cache.stats()}
+
+class MemoryStore:
+    """Stand-in for Redis implementing the few commands the shared cache uses"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value, expires_at = self._data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ex: Optional[float] = None):
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._data[key] = (str(value).encode(), None)
+        return value
+
+class SharedResponseCache:
+    """
+    Responses cached in a store shared by all workers (Redis). The catalog version
+    lives in the store too, so a write in one worker invalidates every worker's view.
+    Entries are stored as a JSON header line (headers and the size of each coding)
+    followed by the bodies.
+    """
+
+    name = "redis"
+    caches = True
+
+    def __init__(self, store, ttl: float, prefix: str = RESPONSE_CACHE_PREFIX):
+        self.store = store
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def version(self) -> int:
+        return int(await self.store.get(self.prefix + "version") or 0)
+
+    async def bump(self) -> int:
+        return await self.store.incr(self.prefix + "version")
+
+    async def invalidate_local(self):
+        # The writer already bumped the shared version
+        pass
+
+    async def get_or_build(self, key: str, build: EntryBuilder) -> CachedResponse:
+        try:
+            raw = await self.store.get(self.prefix + key)
+        except Exception as e:
+            # The store being down should cost latency, not availability
+            self.errors += 1
+            print(f"Response cache read failed: {e}")
+            raw = None
+
+        if raw is not None:
+            self.hits += 1
+            header, _, data = raw.partition(b"\n")
+            meta = json.loads(header)
+            variants, offset = {}, 0
+            for encoding, size in meta["sizes"]:
+                variants[encoding] = data[offset:offset + size]
+                offset += size
+            return variants, meta["headers"]
+
+        self.misses += 1
+        variants, headers = await build()
+        try:
+            meta = {"headers": headers, "sizes": [[e, len(b)] for e, b in variants.items()]}
+            await self.store.set(self.prefix + key, json.dumps(meta).encode() + b"\n" + b"".join(variants.values()), ex=self.ttl)
+        except Exception as e:
+            self.errors += 1
+            print(f"Response cache write failed: {e}")
+        return variants, headers
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "errors": self.errors,
+        }
+
+class NullResponseCache:
+    """Caching disabled; every request is built"""
+
+    name = "none"
+    caches = False
+
+    async def version(self) -> int:
+        return 0
+
+    async def bump(self) -> int:
+        return 0
+
+    async def invalidate_local(self):
+        pass
+
+    async def get_or_build(self, key: str, build: EntryBuilder) -> CachedResponse:
+        return await build()
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+def create_response_cache(backend: str = RESPONSE_CACHE_BACKEND):
+    if backend == "none":
+        return NullResponseCache()
+    if backend == "memory":
+        return MemoryResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS)
+    if backend == "redis":
+        if RESPONSE_CACHE_REDIS_URL.startswith("memory://"):
+            store = MemoryStore()
+        else:
+            # Optional dependency, only needed for the shared backend
+            import redis.asyncio as redis
+
+            store = redis.from_url(RESPONSE_CACHE_REDIS_URL)
+        return SharedResponseCache(store, RESPONSE_CACHE_TTL_SECONDS)
+    raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND: {backend}")
+
+response_cache = create_response_cache()
+
+def set_response_cache(cache):
+    """Replace the response cache (tests, benchmarks)"""
+    global response_cache
+    response_cache = cache
+
+async def cached_response(key: str, build: Builder) -> CachedResponse:
+    """
+    Serve `key` for the current catalog version, building it on a miss.
+    Builders raise (e.g. HTTPException for 404) to keep a response out of the cache.
+    Bodies are compressed once when built, so hits cost no compression. Without a cache
+    only the identity body is returned and CompressionMiddleware compresses it for the
+    coding the client negotiated, if any.
+    """
+    async def build_entry() -> CachedResponse:
+        body, headers = await build()
+        return (precompress(body) if response_cache.caches else {"identity": body}), headers
+
+    version = await response_cache.version()
+    return await response_cache.get_or_build(f"v{version}:{key}", build_entry)
+
+async def bump_catalog_version():
+    """Call after every write to the templates collection"""
+    try:
+        await response_cache.bump()
+    except Exception as e:
+        print(f"Failed to bump catalog version: {e}")
@@ -0,0 +1,26 @@
+from typing import Any
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+def _default(value: Any) -> Any:
+    """Types orjson does not know; datetimes, dicts and lists are handled natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Serialize Mongo documents and plain data to compact UTF-8 JSON"""
+    return orjson.dumps(content, default=_default)
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Routes that build plain dicts straight from
+    Mongo documents can return it directly and skip response model validation.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,12 +1,24 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+import asyncio
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
 from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from app.core.metrics import METRICS_ENABLED, METRICS_TOKEN, MetricsMiddleware
+from app.core.profiling import PROFILING_ENABLED, ProfilingMiddleware
+from app.core.rate_limit import ADMISSION_ENABLED, AdmissionMiddleware
+from app.core.disk_cache import disk_image_cache, flush_image_stats, run_image_stats_forever
+from app.core.image_gc import IMAGE_GC_INTERVAL_SECONDS, run_image_gc_forever
+from app.core.cache_invalidation import CACHE_INVALIDATION_MODE, run_cache_invalidation_forever
 from app.routes import auth, templates
+from app.routes.auth import get_admin_user
+from app.utils.image_upload import UploadSizeLimitMiddleware
+from app.utils.image_variants import shutdown_image_executor
 
 # Load environment variables
 load_dotenv()
@@ -48,8 +60,28 @@ if ALLOW_ALL_ORIGINS:
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    gc_task = None
+    if IMAGE_GC_INTERVAL_SECONDS > 0:
+        gc_task = asyncio.create_task(run_image_gc_forever())
+    stats_task = None
+    if disk_image_cache.enabled:
+        stats_task = asyncio.create_task(run_image_stats_forever())
+    invalidation_task = None
+    if CACHE_INVALIDATION_MODE != "off":
+        invalidation_task = asyncio.create_task(run_cache_invalidation_forever())
     yield
     # Shutdown
+    if invalidation_task:
+        invalidation_task.cancel()
+    if gc_task:
+        gc_task.cancel()
+    if stats_task:
+        stats_task.cancel()
+        try:
+            await flush_image_stats()
+        except Exception as e:
+            print(f"Image stats flush failed: {e}")
+    shutdown_image_executor()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -60,6 +92,14 @@ app = FastAPI(
     redirect_slashes=False  # Disable automatic slash redirects
 )
 
+# Per-worker concurrency caps for auth, upload and read routes (503 + Retry-After when
+# saturated); added first so shed responses still get CORS headers
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
+# Reject oversized image uploads before their multipart body is received and spooled
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -76,9 +116,25 @@ app.add_middleware(
         "X-CSRF-Token",
         "Access-Control-Request-Method",
         "Access-Control-Request-Headers",
+        "Range",
+        "If-None-Match",
+        "If-Modified-Since",
     ],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "Accept-Ranges", "Content-Range", "ETag", "Last-Modified"],
 )
 
+# gzip/brotli for JSON and other text bodies above COMPRESSION_MIN_BYTES; images are sent as stored
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Per-route latency, in-flight and response size metrics, exported at /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Sampled request profiles (stack samples plus DB/bcrypt/JWT spans), see /api/profiles
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # Create uploads directory if it doesn't exist
 os.makedirs("uploads", exist_ok=True)
 
@@ -91,34 +147,222 @@ app.include_router(templates.router, prefix="/api")
 
 # Image serving endpoint - serves images stored in MongoDB
 @app.get("/api/images/{image_id}")
-async def get_image(image_id: str):
-    """Serve image from MongoDB by image_id"""
-    from fastapi.responses import Response
+async def get_image(
+    image_id: str,
+    variant: Optional[str] = Query(None, description="original, webp, medium or thumbnail"),
+    w: Optional[int] = Query(None, ge=1, le=10000, description="Smallest variant at least this wide"),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None)
+):
+    """Serve image by image_id from the hot-image cache, the disk cache or GridFS, with conditional and byte-range requests"""
+    from fastapi.responses import FileResponse, Response, StreamingResponse
     from bson import ObjectId
-    from app.core.database import get_database
-    
+    from app.core.cache import image_cache, IMAGE_CACHE_MAX_ENTRY_BYTES
+    from app.core.database import get_image_file_doc, load_image_entry, open_image_stream
+    from app.core.disk_cache import record_image_request
+    from app.utils.image_streaming import (
+        cache_headers,
+        image_etag,
+        image_last_modified,
+        is_not_modified,
+        iter_grid_out,
+        parse_range_header,
+    )
+    from app.utils.image_variants import VARIANT_NAMES, select_variant
+
     try:
-        db = await get_database()
-        
         # Check if the image_id is a valid MongoDB ObjectId
         if not ObjectId.is_valid(image_id):
             raise HTTPException(status_code=400, detail="Invalid image ID format")
-        
-        # Find the image document in the database
-        image_doc = await db.images.find_one({"_id": ObjectId(image_id)})
-        if not image_doc:
+        if variant and variant not in VARIANT_NAMES:
+            raise HTTPException(status_code=400, detail=f"Unknown variant. Allowed: {', '.join(VARIANT_NAMES)}")
+
+        if if_none_match or if_modified_since:
+            # Revalidation only needs the file documents, so answer it before any blob is read
+            async def cached_file_doc(doc_id: str):
+                cached = image_cache.peek(doc_id)
+                return cached["file_doc"] if cached is not None else await get_image_file_doc(ObjectId(doc_id))
+
+            file_doc = await cached_file_doc(image_id)
+            if file_doc is not None:
+                variant_id = select_variant(file_doc, variant, w)
+                if variant_id:
+                    file_doc = await cached_file_doc(variant_id) or file_doc
+                etag = image_etag(file_doc)
+                last_modified = image_last_modified(file_doc)
+                if is_not_modified(if_none_match, if_modified_since, etag, last_modified):
+                    return Response(status_code=304, headers=cache_headers(etag, last_modified))
+
+        # Cached entries hold the file document and, for small images, the bytes;
+        # concurrent misses for the same id share one database read
+        entry = await image_cache.get_or_load(
+            image_id,
+            lambda: load_image_entry(ObjectId(image_id), IMAGE_CACHE_MAX_ENTRY_BYTES)
+        )
+        if entry is None:
             raise HTTPException(status_code=404, detail="Image not found")
-        
-        # Return the image data with the correct content type
-        return Response(
-            content=image_doc["data"], 
-            media_type=image_doc.get("content_type", "image/png")
+
+        # Resized/WebP variants are listed in the original's metadata
+        variant_id = select_variant(entry["file_doc"], variant, w)
+        if variant_id:
+            variant_entry = await image_cache.get_or_load(
+                variant_id,
+                lambda: load_image_entry(ObjectId(variant_id), IMAGE_CACHE_MAX_ENTRY_BYTES)
+            )
+            entry = variant_entry or entry
+
+        file_doc = entry["file_doc"]
+        etag = image_etag(file_doc)
+        last_modified = image_last_modified(file_doc)
+        headers = cache_headers(etag, last_modified)
+
+        if is_not_modified(if_none_match, if_modified_since, etag, last_modified):
+            return Response(status_code=304, headers=headers)
+
+        media_type = (file_doc.get("metadata") or {}).get("content_type", "image/png")
+        size = file_doc["length"]
+        byte_range = parse_range_header(range_header, size)
+        headers["Accept-Ranges"] = "bytes"
+
+        if byte_range is None:
+            start, end, status_code = 0, size - 1, 200
+        else:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        served_id = str(file_doc["_id"])
+        if disk_image_cache.enabled:
+            record_image_request(served_id)
+
+        if entry["data"] is not None:
+            # Keep a disk copy for when the entry leaves memory or the process restarts
+            disk_image_cache.materialize(entry)
+            return Response(
+                content=entry["data"][start:end + 1],
+                status_code=status_code,
+                media_type=media_type,
+                headers=headers
+            )
+
+        # Larger images are sent from their disk copy (sendfile where the server supports
+        # it); FileResponse answers the Range header itself
+        disk_path = disk_image_cache.path(served_id) if disk_image_cache.enabled else None
+        disk_stat = None
+        if disk_path:
+            try:
+                disk_stat = await asyncio.to_thread(os.stat, disk_path)
+            except FileNotFoundError:
+                # Removed from under the index (e.g. by hand); stream from GridFS and write it again
+                disk_image_cache.invalidate(served_id)
+        if disk_stat is not None:
+            headers.pop("Accept-Ranges")
+            return FileResponse(disk_path, media_type=media_type, headers=headers, stat_result=disk_stat)
+        disk_image_cache.materialize(entry)
+
+        grid_out = await open_image_stream(file_doc)
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            iter_grid_out(grid_out, start, end),
+            status_code=status_code,
+            media_type=media_type,
+            headers=headers
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch image: {str(e)}")
 
+@app.get("/api/cache/stats")
+async def cache_stats(current_user: dict = Depends(get_admin_user)):
+    """Hit, miss and eviction counters of the in-process caches (Admin only)"""
+    from app.core.cache import image_cache, user_cache
+    from app.core import response_cache
+    from app.core.cache_invalidation import stats as invalidation_stats
+
+    return {
+        "images": image_cache.stats(),
+        "images_disk": disk_image_cache.stats(),
+        "users": user_cache.stats(),
+        "responses": response_cache.response_cache.stats(),
+        "invalidation": invalidation_stats,
+    }
+
+@app.get("/api/limits")
+async def limit_stats(current_user: dict = Depends(get_admin_user)):
+    """Rate limit budgets, per-class concurrency and password hash pool of this worker process (Admin only)"""
+    from app.core import rate_limit
+    from app.core.auth import hash_pool_stats
+
+    return {
+        "rate_limits": {
+            "backend": rate_limit.RATE_LIMIT_BACKEND,
+            "enabled": rate_limit.RATE_LIMIT_ENABLED,
+            "budgets": {
+                limit.name: {"capacity": limit.capacity, "per_second": round(limit.rate, 4)}
+                for limit in rate_limit.RATE_LIMITS
+            },
+        },
+        "admission": rate_limit.admission_control.stats(),
+        "password_hashing": hash_pool_stats(),
+    }
+
+@app.get("/api/db/pool")
+async def pool_stats(current_user: dict = Depends(get_admin_user)):
+    """MongoDB connection pool settings and checkout metrics of this worker process (Admin only)"""
+    from app.core import database
+    from app.core.metrics import mongo_pool_stats
+
+    return {
+        "settings": {
+            "maxPoolSize": database.MONGO_MAX_POOL_SIZE,
+            "minPoolSize": database.MONGO_MIN_POOL_SIZE,
+            "maxIdleTimeMS": database.MONGO_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": database.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        },
+        "metrics": mongo_pool_stats()
+    }
+
+@app.get("/api/profiles")
+async def list_profiles(current_user: dict = Depends(get_admin_user)):
+    """Recently captured request profiles of this worker process, newest first (Admin only)"""
+    from app.core.profiling import profiles
+
+    return [profile.summary() for profile in reversed(profiles)]
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|collapsed)$", description="json, or collapsed stacks for flame graph tools"),
+    current_user: dict = Depends(get_admin_user)
+):
+    """One request profile: span breakdown as JSON, or its stack samples in collapsed format (Admin only)"""
+    from fastapi.responses import PlainTextResponse
+    from app.core.profiling import get_profile as find_profile
+
+    profile = find_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    return profile.to_dict()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus exposition of request, MongoDB and password hashing metrics"""
+    from fastapi.responses import Response
+    from app.core.metrics import render_metrics
+
+    import secrets
+
+    if not METRICS_ENABLED or not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/")
 async def root():
     return {"message": "Template Sharing Platform API", "version": "1.0.0"}
@@ -149,17 +393,34 @@ async def list_endpoints():
                 "login": "POST /api/auth/login"
             },
             "templates": {
-                "list": "GET /api/templates/ (requires auth)",
+                "list": "GET /api/templates/?limit=&cursor=&fields= (requires auth)",
+                "search": "GET /api/templates/search?q=&mode=text|prefix (requires auth)",
+                "export": "GET /api/templates/export (NDJSON, requires auth)",
                 "create": "POST /api/templates (requires admin auth)",
+                "import": "POST /api/templates/import (archive upload, requires admin auth)",
                 "get": "GET /api/templates/{id} (requires auth)",
                 "update": "PUT /api/templates/{id} (requires admin auth)",
                 "delete": "DELETE /api/templates/{id} (requires admin auth)"
             },
             "images": {
-                "get": "GET /api/images/{image_id}"
+                "get": "GET /api/images/{image_id}?variant=&w="
+            },
+            "cache": {
+                "stats": "GET /api/cache/stats (requires admin auth)"
+            },
+            "db": {
+                "pool": "GET /api/db/pool (requires admin auth)"
+            },
+            "limits": {
+                "stats": "GET /api/limits (requires admin auth)"
+            },
+            "profiles": {
+                "list": "GET /api/profiles (requires admin auth)",
+                "get": "GET /api/profiles/{id}?format=json|collapsed (requires admin auth)"
             },
             "health": {
                 "check": "GET /api/health",
+                "metrics": "GET /metrics (Prometheus format)",
                 "cors": "GET /api/cors-debug",
                 "endpoints": "GET /api/endpoints"
             }
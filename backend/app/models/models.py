@@ -59,6 +59,19 @@ class TemplateResponse(TemplateBase):
             datetime: lambda v: v.isoformat()
         }
 
+class TemplateListItem(BaseModel):
+    """Template as returned by list endpoints; only the requested fields are set"""
+    id: Optional[str] = Field(None, alias="_id")
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    created_by: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
+
 class PaymentIntent(BaseModel):
     amount: int
     currency: str = "usd"
@@ -1,14 +1,24 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timezone
+from pymongo.errors import DuplicateKeyError
 from app.models.models import UserCreate, UserLogin, Token, UserResponse, ApiResponse
-from app.core.auth import get_password_hash, verify_password, create_access_token, verify_token
+from app.core.auth import (
+    create_access_token,
+    get_password_hash_async,
+    password_needs_rehash,
+    verify_password_async,
+    verify_token,
+)
+from app.core.cache import user_cache, TRUST_TOKEN_ROLE
 from app.core.database import get_database
+from app.core.rate_limit import login_rate_limit, register_rate_limit
+from app.core.serialization import FastJSONResponse
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], default_response_class=FastJSONResponse)
 security = HTTPBearer()
 
-@router.post("/register", response_model=ApiResponse)
+@router.post("/register", response_model=ApiResponse, dependencies=[Depends(register_rate_limit)])
 async def register(user: UserCreate):
     """Register a new user"""
     try:
@@ -23,7 +33,7 @@ async def register(user: UserCreate):
             )
         
         # Hash password and create user
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         user_doc = {
             "email": user.email,
             "username": user.username,
@@ -32,7 +42,14 @@ async def register(user: UserCreate):
             "created_at": datetime.now(timezone.utc)
         }
         
-        result = await db.users.insert_one(user_doc)
+        try:
+            result = await db.users.insert_one(user_doc)
+        except DuplicateKeyError:
+            # Concurrent registration of the same email lost the race on the unique index
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
         
         return ApiResponse(
             success=True,
@@ -48,7 +65,7 @@ async def register(user: UserCreate):
             detail=f"Registration failed: {str(e)}"
         )
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(login_rate_limit)])
 async def login(user_credentials: UserLogin):
     """Authenticate user and return access token"""
     try:
@@ -56,17 +73,33 @@ async def login(user_credentials: UserLogin):
         
         # Find user by email
         user = await db.users.find_one({"email": user_credentials.email})
-        if not user or not verify_password(user_credentials.password, user["password"]):
+        if not user or not await verify_password_async(user_credentials.password, user["password"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+
+        # Upgrade hashes created with outdated settings while we have the plain password
+        if password_needs_rehash(user["password"]):
+            try:
+                new_hash = await get_password_hash_async(user_credentials.password)
+                await db.users.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+            except HTTPException:
+                # Hash pool is saturated; the upgrade is retried on a later login
+                pass
         
-        # Create access token
+        # Create access token; uid/username let get_current_user skip the lookup
+        # when TRUST_TOKEN_ROLE is enabled
         access_token = create_access_token(
-            data={"sub": user["email"], "role": user["role"]}
+            data={
+                "sub": user["email"],
+                "role": user["role"],
+                "uid": str(user["_id"]),
+                "username": user["username"]
+            }
         )
+        user_cache.set(user["email"], principal_from_user(user))
         
         # Prepare user response
         user_response = UserResponse(
@@ -91,14 +124,35 @@ async def login(user_credentials: UserLogin):
             detail=f"Login failed: {str(e)}"
         )
 
+def principal_from_user(user: dict) -> dict:
+    """The subset of a user document that request handlers rely on"""
+    return {
+        "id": str(user["_id"]),
+        "email": user["email"],
+        "username": user["username"],
+        "role": user["role"]
+    }
+
+async def load_principal(email: str):
+    db = await get_database()
+    user = await db.users.find_one({"email": email}, {"email": 1, "username": 1, "role": 1})
+    return principal_from_user(user) if user else None
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user"""
     try:
         payload = verify_token(credentials.credentials)
         email = payload.get("sub")
-        
-        db = await get_database()
-        user = await db.users.find_one({"email": email})
+
+        if TRUST_TOKEN_ROLE and all(claim in payload for claim in ("uid", "username", "role")):
+            return {
+                "id": payload["uid"],
+                "email": email,
+                "username": payload["username"],
+                "role": payload["role"]
+            }
+
+        user = await user_cache.get_or_load(email, lambda: load_principal(email))
         
         if user is None:
             raise HTTPException(
@@ -107,12 +161,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        return {
-            "id": str(user["_id"]),
-            "email": user["email"],
-            "username": user["username"],
-            "role": user["role"]
-        }
+        return user
     
     except HTTPException:
         raise
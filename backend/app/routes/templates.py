@@ -1,19 +1,46 @@
 # Import all necessary libraries at the top for better organization
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Query, Header
+from fastapi.responses import Response, StreamingResponse
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 from bson import ObjectId
+import os
+import re
 
 # Import our custom modules
-from app.models.models import TemplateCreate, TemplateResponse, TemplateUpdate, ApiResponse
+from app.models.models import TemplateCreate, TemplateResponse, TemplateUpdate, TemplateListItem, ApiResponse
 from app.routes.auth import get_current_user, get_admin_user
+from app.core.compression import PrecompressedResponse
 from app.core.database import get_database
-from app.utils.image_upload import save_upload_file, validate_image_file
+from app.core.rate_limit import import_rate_limit, upload_rate_limit
+from app.core.serialization import FastJSONResponse, dumps
+from app.core.response_cache import bump_catalog_version, cached_response
+from app.utils.bulk_import import ArchiveImportError, IMPORT_BATCH_SIZE, import_archive
+from app.utils.image_storage import get_image_storage, release_template_image
+from app.utils.image_upload import validate_image_file
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    TEMPLATE_FIELDS,
+    build_projection,
+    encode_cursor,
+    keyset_filter,
+    parse_fields,
+)
 
-router = APIRouter(prefix="/templates", tags=["Templates"])
+router = APIRouter(prefix="/templates", tags=["Templates"], default_response_class=FastJSONResponse)
 
-@router.post("", response_model=ApiResponse)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Documents fetched per Motor round trip and bytes buffered per chunk when exporting
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Fields shown on search result cards
+SEARCH_FIELDS = ("id", "title", "description", "image_url")
+JSON_MEDIA_TYPE = "application/json"
+# Key order of TemplateResponse serialized by alias
+DETAIL_FIELDS = ("title", "description", "image_url", "_id", "created_by", "created_at", "updated_at")
+
+@router.post("", response_model=ApiResponse, dependencies=[Depends(upload_rate_limit)])
 async def create_template(
     title: str = Form(...),
     description: str = Form(...),
@@ -29,30 +56,24 @@ async def create_template(
                 detail="Invalid image file. Only JPEG, PNG, GIF, and WebP are allowed."
             )
         
-        # Store image in MongoDB and get image_id
-        from app.core.database import store_image_in_mongo
-        image_bytes = await image.read()
-        image_id = await store_image_in_mongo(image_bytes, image.filename, image.content_type)
-        
-        # Generate full image URL endpoint
-        import os
-        base_url = os.getenv("BASE_URL", "http://localhost:8000")
-        image_url = f"{base_url}/api/images/{image_id}"
+        # Stream the image into the configured storage backend
+        stored = await get_image_storage().save(image)
 
         db = await get_database()
 
         # Create template document
         template_doc = {
             "title": title,
+            "title_lower": title.lower(),
             "description": description,
-            "image_url": image_url,
-            "image_id": str(image_id),
+            **stored,
             "created_by": current_user["id"],
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
         }
 
         result = await db.templates.insert_one(template_doc)
+        await bump_catalog_version()
 
         return ApiResponse(
             success=True,
@@ -68,65 +89,201 @@ async def create_template(
             detail=f"Failed to create template: {str(e)}"
         )
 
-@router.get("/public", response_model=List[TemplateResponse])
-async def get_public_templates():
-    """Get all templates (public endpoint for testing)"""
-    try:
+def template_image_id(template: dict) -> Optional[str]:
+    """Image id of a template, falling back to the /api/images/{id} URL for older documents"""
+    if template.get("image_id"):
+        return template["image_id"]
+    image_url = template.get("image_url") or ""
+    if "/api/images/" in image_url:
+        return image_url.rsplit("/", 1)[-1]
+    return None
+
+async def list_templates_page(
+    cursor: Optional[str],
+    limit: int,
+    fields: Optional[str]
+) -> Response:
+    """
+    Fetch one keyset page of templates ordered by (created_at, _id).
+    The cursor for the following page is returned in the X-Next-Cursor header.
+    Serialized (and compressed) pages are cached per catalog version.
+    """
+    selected = parse_fields(fields)
+
+    async def build():
         db = await get_database()
-        
-        templates_cursor = db.templates.find({})
-        templates = []
-        
-        async for template in templates_cursor:
-            template_response = TemplateResponse(
-                id=str(template["_id"]),
-                title=template["title"],
-                description=template["description"],
-                image_url=template["image_url"],
-                created_by=template["created_by"],
-                created_at=template["created_at"],
-                updated_at=template["updated_at"]
+        templates_cursor = (
+            db.templates.find(keyset_filter(cursor), build_projection(selected))
+            .sort([("created_at", 1), ("_id", 1)])
+            .limit(limit + 1)
+        )
+        docs = await templates_cursor.to_list(length=limit + 1)
+
+        headers = {}
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last["created_at"], last["_id"])
+
+        return dumps([to_list_item(template, selected) for template in docs]), headers
+
+    variants, headers = await cached_response(f"list:{cursor}:{limit}:{','.join(selected)}", build)
+    return PrecompressedResponse(variants, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+def to_list_item(template: dict, selected: Tuple[str, ...]) -> dict:
+    """
+    Map a projected template document straight to the JSON shape of TemplateListItem.
+    Only selected fields are present (like exclude_unset) and the id is keyed `_id`
+    (by alias); ObjectIds and datetimes are left for the JSON encoder.
+    """
+    return {
+        "_id" if f == "id" else f: template["_id"] if f == "id" else template.get(f)
+        for f in TEMPLATE_FIELDS if f in selected
+    }
+
+async def stream_templates_ndjson(selected: Tuple[str, ...]) -> AsyncIterator[bytes]:
+    """Yield every template as newline delimited JSON, buffering up to EXPORT_CHUNK_BYTES"""
+    db = await get_database()
+    templates_cursor = (
+        db.templates.find({}, build_projection(selected))
+        .sort([("created_at", 1), ("_id", 1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+
+    buffer = bytearray()
+    async for template in templates_cursor:
+        buffer += dumps(to_list_item(template, selected))
+        buffer += b"\n"
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+@router.post("/import", response_model=dict, dependencies=[Depends(import_rate_limit)])
+async def import_templates(
+    archive: UploadFile = File(..., description="zip or tar of images plus manifest.json or manifest.csv"),
+    job_id: Optional[str] = Form(None, description="Re-use to resume an interrupted import; defaults to the archive hash"),
+    batch_size: int = Form(IMPORT_BATCH_SIZE, ge=1, le=5000),
+    current_user: dict = Depends(get_admin_user)
+):
+    """Bulk import templates from an archive (Admin only)"""
+    try:
+        return await import_archive(archive.file, current_user["id"], job_id=job_id, batch_size=batch_size)
+
+    except ArchiveImportError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import templates: {str(e)}"
+        )
+
+@router.get("/public", response_model=List[TemplateListItem], response_model_exclude_unset=True)
+async def get_public_templates(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated fields, e.g. title,image_url")
+):
+    """Get a page of templates (public endpoint for testing)"""
+    try:
+        return await list_templates_page(cursor, limit, fields)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch templates: {str(e)}"
+        )
+
+@router.get("/", response_model=List[TemplateListItem], response_model_exclude_unset=True)
+@router.get("", response_model=List[TemplateListItem], response_model_exclude_unset=True)
+async def get_templates(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated fields, e.g. title,image_url"),
+    accept: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a page of templates, or stream all of them when NDJSON is accepted"""
+    try:
+        if accept and NDJSON_MEDIA_TYPE in accept:
+            return StreamingResponse(
+                stream_templates_ndjson(parse_fields(fields)),
+                media_type=NDJSON_MEDIA_TYPE
             )
-            templates.append(template_response)
-        
-        return templates
-    
+        return await list_templates_page(cursor, limit, fields)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to fetch templates: {str(e)}"
         )
 
-@router.get("/", response_model=List[TemplateResponse])
-@router.get("", response_model=List[TemplateResponse])
-async def get_templates(current_user: dict = Depends(get_current_user)):
-    """Get all templates"""
+@router.get("/search", response_model=List[TemplateListItem], response_model_exclude_unset=True)
+async def search_templates(
+    q: str = Query(..., min_length=1, max_length=100, description="Search terms, or a title prefix in prefix mode"),
+    mode: str = Query("text", pattern="^(text|prefix)$", description="text: relevance ranked, prefix: autocomplete on title"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=10000),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Search templates by title and description.
+    The offset of the following page is returned in the X-Next-Offset header.
+    """
     try:
         db = await get_database()
-        
-        templates_cursor = db.templates.find({})
-        templates = []
-        
-        async for template in templates_cursor:
-            template_response = TemplateResponse(
-                id=str(template["_id"]),
-                title=template["title"],
-                description=template["description"],
-                image_url=template["image_url"],
-                created_by=template["created_by"],
-                created_at=template["created_at"],
-                updated_at=template["updated_at"]
+        projection = build_projection(SEARCH_FIELDS)
+
+        if mode == "prefix":
+            # Anchored regex on the lower-cased title is answered from the title_lower index
+            query = {"title_lower": {"$regex": f"^{re.escape(q.strip().lower())}"}}
+            templates_cursor = db.templates.find(query, projection).sort("title_lower", 1)
+        else:
+            projection["score"] = {"$meta": "textScore"}
+            templates_cursor = (
+                db.templates.find({"$text": {"$search": q}}, projection)
+                .sort([("score", {"$meta": "textScore"})])
             )
-            templates.append(template_response)
-        
-        return templates
-    
+
+        docs = await templates_cursor.skip(offset).limit(limit + 1).to_list(length=limit + 1)
+        headers = {}
+        if len(docs) > limit:
+            headers["X-Next-Offset"] = str(offset + limit)
+
+        return FastJSONResponse([to_list_item(template, SEARCH_FIELDS) for template in docs[:limit]], headers=headers)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to fetch templates: {str(e)}"
+            detail=f"Failed to search templates: {str(e)}"
         )
 
+@router.get("/export", response_class=StreamingResponse)
+async def export_templates(
+    fields: Optional[str] = Query(None, description="Comma separated fields, e.g. title,image_url"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream every template as NDJSON (one JSON object per line).
+    Memory use is bounded by the cursor batch size, not the catalog size.
+    """
+    selected = parse_fields(fields)
+    return StreamingResponse(
+        stream_templates_ndjson(selected),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="templates.ndjson"'}
+    )
+
 @router.get("/{template_id}", response_model=TemplateResponse)
 async def get_template(
     template_id: str,
@@ -134,31 +291,28 @@ async def get_template(
 ):
     """Get a specific template by ID"""
     try:
-        db = await get_database()
-        
         if not ObjectId.is_valid(template_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Invalid template ID format"
             )
-        
-        template = await db.templates.find_one({"_id": ObjectId(template_id)})
-        
-        if not template:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Template not found"
+
+        async def build():
+            db = await get_database()
+            template = await db.templates.find_one(
+                {"_id": ObjectId(template_id)}, {f: 1 for f in DETAIL_FIELDS}
             )
-        
-        return TemplateResponse(
-            id=str(template["_id"]),
-            title=template["title"],
-            description=template["description"],
-            image_url=template["image_url"],
-            created_by=template["created_by"],
-            created_at=template["created_at"],
-            updated_at=template["updated_at"]
-        )
+
+            if not template:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Template not found"
+                )
+
+            return dumps({f: template.get(f) for f in DETAIL_FIELDS}), {}
+
+        variants, headers = await cached_response(f"detail:{template_id}", build)
+        return PrecompressedResponse(variants, media_type=JSON_MEDIA_TYPE, headers=headers)
     
     except HTTPException:
         raise
@@ -168,7 +322,7 @@ async def get_template(
             detail=f"Failed to fetch template: {str(e)}"
         )
 
-@router.put("/{template_id}", response_model=ApiResponse)
+@router.put("/{template_id}", response_model=ApiResponse, dependencies=[Depends(upload_rate_limit)])
 async def update_template(
     template_id: str,
     title: Optional[str] = Form(None),
@@ -199,6 +353,7 @@ async def update_template(
         
         if title:
             update_doc["title"] = title
+            update_doc["title_lower"] = title.lower()
         if description:
             update_doc["description"] = description
         if image:
@@ -207,13 +362,19 @@ async def update_template(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid image file. Only JPEG, PNG, GIF, and WebP are allowed."
                 )
-            update_doc["image_url"] = await save_upload_file(image)
+            update_doc.update(await get_image_storage().save(image))
         
         # Update template
         await db.templates.update_one(
             {"_id": ObjectId(template_id)},
             {"$set": update_doc}
         )
+        await bump_catalog_version()
+
+        # Drop the template's reference to the replaced image. Re-uploading identical
+        # content took a second reference on the same image, so release it then too
+        if image:
+            await release_template_image(template, template_image_id(template))
         
         return ApiResponse(
             success=True,
@@ -244,13 +405,17 @@ async def delete_template(
             )
         
         # Delete template
-        result = await db.templates.delete_one({"_id": ObjectId(template_id)})
+        template = await db.templates.find_one_and_delete({"_id": ObjectId(template_id)})
         
-        if result.deleted_count == 0:
+        if template is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Template not found"
             )
+        await bump_catalog_version()
+
+        # Images are shared between templates with identical uploads; release ours
+        await release_template_image(template, template_image_id(template))
         
         return ApiResponse(
             success=True,
@@ -0,0 +1,59 @@
+"""
+Bulk import templates from a zip/tar archive of images plus a manifest.
+
+The manifest (manifest.json or manifest.csv at the archive root) lists
+title, description and image (path inside the archive) per template, with an
+optional key. Re-running with the same --job-id (by default the archive's
+SHA-256) skips items that were already imported.
+
+Usage:
+    python -m app.scripts.bulk_import templates.zip --created-by <user_id> [--report report.json]
+"""
+import argparse
+import asyncio
+import json
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.utils.bulk_import import IMPORT_BATCH_SIZE, IMPORT_CONCURRENCY, import_archive
+from app.utils.image_variants import shutdown_image_executor
+
+def print_progress(summary: dict):
+    done = summary["imported"] + summary["skipped"] + summary["failed"]
+    print(f"{done}/{summary['total']} processed "
+          f"({summary['imported']} imported, {summary['skipped']} skipped, {summary['failed']} failed)")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Bulk import templates from an archive")
+    parser.add_argument("archive", help="Path to a .zip or .tar(.gz) archive")
+    parser.add_argument("--created-by", required=True, help="User id recorded as the templates' creator")
+    parser.add_argument("--job-id", help="Checkpoint id; defaults to the archive SHA-256")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Templates per insert_many")
+    parser.add_argument("--concurrency", type=int, default=IMPORT_CONCURRENCY, help="Images stored in parallel")
+    parser.add_argument("--report", help="Write the per-item report to this JSON file")
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    try:
+        with open(args.archive, "rb") as fileobj:
+            report = await import_archive(
+                fileobj,
+                args.created_by,
+                job_id=args.job_id,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                progress=print_progress
+            )
+    finally:
+        shutdown_image_executor()
+        await close_mongo_connection()
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    for item in report["items"]:
+        if item["status"] == "failed":
+            print(f"FAILED {item['key']}: {item['error']}")
+    print(f"Job {report['job_id']}: {report['imported']} imported, "
+          f"{report['skipped']} skipped, {report['failed']} failed of {report['total']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,43 @@
+"""
+Apply the index registry and verify that hot queries are index backed.
+
+Exits with status 1 if any query in app.core.indexes.HOT_QUERIES falls back to a
+collection scan, so it can gate deployments.
+
+Usage:
+    python -m app.scripts.check_indexes [--no-apply]
+"""
+import argparse
+import asyncio
+import sys
+from app.core import database
+from app.core.indexes import apply_indexes, find_collection_scans
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Verify index coverage of hot queries")
+    parser.add_argument("--no-apply", action="store_true", help="Only check, do not create missing indexes")
+    args = parser.parse_args()
+
+    # The check runs here explicitly; don't let connect_to_mongo raise first
+    database.VERIFY_QUERY_PLANS = False
+    await database.connect_to_mongo()
+    try:
+        db = await database.get_database()
+        if not args.no_apply:
+            names = await apply_indexes(db)
+            print(f"Indexes present: {', '.join(names)}")
+
+        problems = await find_collection_scans(db)
+        if problems:
+            print("Hot queries falling back to COLLSCAN:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+
+        print("All hot queries use indexes")
+        return 0
+    finally:
+        await database.close_mongo_connection()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,43 @@
+"""
+Delete images that no template references.
+
+Runs the same sweep as the in-process collector (IMAGE_GC_INTERVAL_SECONDS).
+Start with --dry-run to see what would be removed.
+
+Usage:
+    python -m app.scripts.gc_images [--dry-run] [--batch-size 50] [--pause 1] [--grace 3600]
+"""
+import argparse
+import asyncio
+import json
+from app.core.database import connect_to_mongo, close_mongo_connection
+from app.core.image_gc import (
+    IMAGE_GC_BATCH_PAUSE_SECONDS,
+    IMAGE_GC_BATCH_SIZE,
+    IMAGE_GC_GRACE_SECONDS,
+    collect_orphaned_images,
+)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Garbage collect unreferenced images")
+    parser.add_argument("--dry-run", action="store_true", help="Only report orphaned images")
+    parser.add_argument("--batch-size", type=int, default=IMAGE_GC_BATCH_SIZE, help="Deletes per batch")
+    parser.add_argument("--pause", type=float, default=IMAGE_GC_BATCH_PAUSE_SECONDS, help="Seconds between batches")
+    parser.add_argument("--grace", type=float, default=IMAGE_GC_GRACE_SECONDS, help="Skip images younger than this (seconds)")
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    try:
+        report = await collect_orphaned_images(
+            dry_run=args.dry_run,
+            batch_size=args.batch_size,
+            batch_pause=args.pause,
+            grace_seconds=args.grace
+        )
+    finally:
+        await close_mongo_connection()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
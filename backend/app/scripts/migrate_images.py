@@ -0,0 +1,60 @@
+"""
+Move image blobs from the legacy `images` collection into the GridFS bucket.
+
+Each image keeps its ObjectId, so existing /api/images/{image_id} URLs keep working.
+Already migrated images are skipped, which makes the command safe to re-run.
+
+Usage:
+    python -m app.scripts.migrate_images [--delete-legacy] [--batch-size 50]
+"""
+import argparse
+import asyncio
+import hashlib
+from app.core.database import connect_to_mongo, close_mongo_connection, get_database, get_image_bucket, IMAGE_BUCKET_NAME
+
+async def migrate_images(delete_legacy: bool = False, batch_size: int = 50) -> dict:
+    """Copy every legacy image document into GridFS, optionally deleting the source"""
+    db = await get_database()
+    bucket = await get_image_bucket()
+    files = db[f"{IMAGE_BUCKET_NAME}.files"]
+    stats = {"migrated": 0, "skipped": 0, "deleted": 0}
+
+    # Small batches keep only a handful of blobs in memory at a time
+    async for image_doc in db.images.find({}).batch_size(batch_size):
+        image_id = image_doc["_id"]
+
+        if await files.find_one({"_id": image_id}, {"_id": 1}):
+            stats["skipped"] += 1
+        else:
+            await bucket.upload_from_stream_with_id(
+                image_id,
+                image_doc.get("filename") or "image",
+                image_doc["data"],
+                metadata={
+                    "content_type": image_doc.get("content_type", "image/png"),
+                    "sha256": hashlib.sha256(image_doc["data"]).hexdigest()
+                }
+            )
+            stats["migrated"] += 1
+
+        if delete_legacy:
+            await db.images.delete_one({"_id": image_id})
+            stats["deleted"] += 1
+
+    return stats
+
+async def main():
+    parser = argparse.ArgumentParser(description="Migrate legacy image documents into GridFS")
+    parser.add_argument("--delete-legacy", action="store_true", help="Delete each legacy document once it is in GridFS")
+    parser.add_argument("--batch-size", type=int, default=50, help="Legacy documents fetched per round trip")
+    args = parser.parse_args()
+
+    await connect_to_mongo()
+    try:
+        stats = await migrate_images(args.delete_legacy, args.batch_size)
+        print(f"Migrated {stats['migrated']}, skipped {stats['skipped']}, deleted {stats['deleted']} legacy images")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,264 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+from datetime import datetime, timezone
+from typing import BinaryIO, Callable, Dict, List, Optional
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+
+from app.core.database import get_database
+from app.core.response_cache import bump_catalog_version
+from app.utils.image_upload import MAX_UPLOAD_BYTES, sniff_image_type
+from app.utils.image_storage import get_image_storage
+
+load_dotenv()
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "8"))
+MANIFEST_NAMES = ("manifest.json", "manifest.csv")
+# Largest manifest read into memory; images are capped by MAX_UPLOAD_BYTES like uploads
+IMPORT_MAX_MANIFEST_BYTES = int(os.getenv("IMPORT_MAX_MANIFEST_BYTES", str(16 * 1024 * 1024)))
+
+class ArchiveImportError(Exception):
+    """Raised for archives that cannot be imported at all (bad format, missing manifest)"""
+
+class ArchiveReader:
+    """
+    Uniform member access for zip and tar archives.
+    Opening and reading are blocking (tar indexing decompresses the whole stream);
+    call them through asyncio.to_thread. Reads are serialized, as tar members share
+    one file position.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self._lock = threading.Lock()
+        fileobj.seek(0)
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            self._zip = zipfile.ZipFile(fileobj)
+            self._tar = None
+            self._sizes = {i.filename: i.file_size for i in self._zip.infolist() if not i.is_dir()}
+        else:
+            fileobj.seek(0)
+            try:
+                self._tar = tarfile.open(fileobj=fileobj, mode="r:*")
+            except tarfile.TarError:
+                raise ArchiveImportError("Archive must be a zip or tar file")
+            self._zip = None
+            self._members = {m.name: m for m in self._tar.getmembers() if m.isfile()}
+            self._sizes = {name: m.size for name, m in self._members.items()}
+        self.names = list(self._sizes)
+
+    def size(self, name: str) -> int:
+        """Uncompressed size recorded in the archive; reads never return more"""
+        return self._sizes[name]
+
+    def read(self, name: str, max_bytes: int) -> bytes:
+        """Read a member, refusing members larger than max_bytes before decompressing them"""
+        if self.size(name) > max_bytes:
+            raise ArchiveImportError(f"{name} exceeds the maximum size of {max_bytes} bytes")
+        with self._lock:
+            if self._zip is not None:
+                return self._zip.read(name)
+            return self._tar.extractfile(self._members[name]).read(max_bytes)
+
+    def close(self):
+        (self._zip or self._tar).close()
+
+def _normalize(name: str) -> str:
+    return posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+
+def load_manifest(reader: ArchiveReader) -> List[dict]:
+    """
+    Read manifest.json (a list of objects) or manifest.csv from the archive root.
+    Each item needs title, description and image (path inside the archive); an
+    optional key identifies the item for resumable imports.
+    """
+    by_name = {_normalize(n): n for n in reader.names}
+    for manifest_name in MANIFEST_NAMES:
+        if manifest_name not in by_name:
+            continue
+        raw = reader.read(by_name[manifest_name], IMPORT_MAX_MANIFEST_BYTES).decode("utf-8-sig")
+        if manifest_name.endswith(".json"):
+            items = json.loads(raw)
+            if isinstance(items, dict):
+                items = items.get("templates", [])
+        else:
+            items = list(csv.DictReader(io.StringIO(raw)))
+        if not isinstance(items, list):
+            raise ArchiveImportError("Manifest must contain a list of templates")
+        return items
+    raise ArchiveImportError(f"Archive must contain one of: {', '.join(MANIFEST_NAMES)}")
+
+def _text(item: dict, field: str) -> str:
+    """A string field of a manifest item, stripped; anything else counts as missing"""
+    value = item.get(field)
+    return value.strip() if isinstance(value, str) else ""
+
+def item_key(item: dict, index: int) -> str:
+    """Stable identity of a manifest item across re-runs of the same job"""
+    if item.get("key"):
+        return str(item["key"])
+    return f"{item.get('image', '')}|{item.get('title', '')}" if item.get("image") else f"row-{index}"
+
+def archive_job_id(fileobj: BinaryIO) -> str:
+    """Default job id: SHA-256 of the archive, so re-uploading it resumes the same job"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+async def import_archive(
+    fileobj: BinaryIO,
+    created_by: str,
+    job_id: Optional[str] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    concurrency: int = IMPORT_CONCURRENCY,
+    progress: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Import templates from an archive of images plus a manifest.
+    Images are stored with bounded concurrency, templates are written with
+    insert_many(ordered=False) per batch, and every imported item is checkpointed
+    in `import_items` so an interrupted job can be re-run with the same job_id.
+    Returns:
+        Report with counts and a per-item status list.
+    """
+    if job_id is None:
+        job_id = await asyncio.to_thread(archive_job_id, fileobj)
+
+    reader = await asyncio.to_thread(ArchiveReader, fileobj)
+    try:
+        manifest = await asyncio.to_thread(load_manifest, reader)
+        members = {_normalize(n): n for n in reader.names}
+        db = await get_database()
+
+        done = set()
+        async for checkpoint in db.import_items.find({"job_id": job_id}, {"key": 1}):
+            done.add(checkpoint["key"])
+
+        results: List[dict] = []
+        pending = []
+        scheduled = set()
+        for index, item in enumerate(manifest):
+            if not isinstance(item, dict):
+                results.append({"key": f"row-{index}", "status": "failed", "error": "Manifest entries must be objects"})
+                continue
+            key = item_key(item, index)
+            if key in done:
+                results.append({"key": key, "status": "skipped"})
+            elif key in scheduled:
+                results.append({"key": key, "status": "failed", "error": f"Duplicate item key in manifest: {key}"})
+            else:
+                scheduled.add(key)
+                pending.append((key, item))
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def ingest(key: str, item: dict) -> dict:
+            title = _text(item, "title")
+            description = _text(item, "description")
+            image_name = _text(item, "image")
+            image_name = _normalize(image_name) if image_name else ""
+            if not title or not description or not image_name:
+                return {"key": key, "status": "failed", "error": "title, description and image are required"}
+
+            member = members.get(image_name)
+            if member is None:
+                return {"key": key, "status": "failed", "error": f"Image not found in archive: {image_name}"}
+
+            if reader.size(member) > MAX_UPLOAD_BYTES:
+                return {"key": key, "status": "failed", "error": f"Image exceeds the maximum upload size of {MAX_UPLOAD_BYTES} bytes: {image_name}"}
+
+            async with semaphore:
+                try:
+                    image_bytes = await asyncio.to_thread(reader.read, member, MAX_UPLOAD_BYTES)
+                except Exception as e:
+                    return {"key": key, "status": "failed", "error": f"Could not read {image_name}: {e}"}
+
+                # Same check as uploads: the type comes from the magic bytes, not the file name
+                content_type = sniff_image_type(image_bytes)
+                if content_type is None:
+                    return {"key": key, "status": "failed", "error": f"Unsupported image type: {image_name}"}
+
+                try:
+                    stored = await get_image_storage().save_bytes(image_bytes, posixpath.basename(image_name), content_type)
+                except Exception as e:
+                    return {"key": key, "status": "failed", "error": f"Image upload failed: {e}"}
+
+            now = datetime.now(timezone.utc)
+            return {
+                "key": key,
+                "status": "pending",
+                "doc": {
+                    "title": title,
+                    "title_lower": title.lower(),
+                    "description": description,
+                    **stored,
+                    "created_by": created_by,
+                    "created_at": now,
+                    "updated_at": now
+                }
+            }
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            outcomes = await asyncio.gather(*(ingest(key, item) for key, item in batch))
+            ready = [o for o in outcomes if o["status"] == "pending"]
+
+            await _insert_batch(db, job_id, ready)
+            results.extend({k: v for k, v in o.items() if k != "doc"} for o in outcomes)
+            if progress:
+                progress(_summary(job_id, len(manifest), results))
+
+        report = _summary(job_id, len(manifest), results)
+        report["items"] = results
+        return report
+    finally:
+        await asyncio.to_thread(reader.close)
+
+async def _insert_batch(db, job_id: str, ready: List[dict]):
+    """Insert one batch of templates and checkpoint the ones that were written"""
+    if not ready:
+        return
+
+    failed: Dict[int, str] = {}
+    try:
+        await db.templates.insert_many([o["doc"] for o in ready], ordered=False)
+    except BulkWriteError as e:
+        failed = {err["index"]: err.get("errmsg", "write failed") for err in e.details.get("writeErrors", [])}
+    finally:
+        # Part of the batch may have been written even when insert_many raised
+        await bump_catalog_version()
+
+    checkpoints = []
+    for index, outcome in enumerate(ready):
+        if index in failed:
+            outcome["status"] = "failed"
+            outcome["error"] = failed[index]
+        else:
+            outcome["status"] = "imported"
+            outcome["template_id"] = str(outcome["doc"]["_id"])
+            checkpoints.append({"job_id": job_id, "key": outcome["key"], "template_id": outcome["template_id"]})
+
+    if checkpoints:
+        try:
+            await db.import_items.insert_many(checkpoints, ordered=False)
+        except BulkWriteError:
+            # Duplicate checkpoints from an overlapping run are harmless
+            pass
+
+def _summary(job_id: str, total: int, results: List[dict]) -> dict:
+    counts = {"imported": 0, "skipped": 0, "failed": 0}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {"job_id": job_id, "total": total, **counts}
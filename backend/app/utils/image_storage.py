@@ -0,0 +1,236 @@
+import asyncio
+import mimetypes
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+from fastapi import UploadFile
+from dotenv import load_dotenv
+
+from app.core.disk_cache import remove_file
+from app.utils.image_upload import image_url_for, read_upload_chunks
+
+load_dotenv()
+
+# gridfs (default), local, cloudinary or memory
+IMAGE_STORAGE_BACKEND = os.getenv("IMAGE_STORAGE_BACKEND", "gridfs").lower()
+# Per-attempt timeout and retry policy for remote backends (Cloudinary)
+IMAGE_STORAGE_TIMEOUT_SECONDS = float(os.getenv("IMAGE_STORAGE_TIMEOUT_SECONDS", "30"))
+IMAGE_STORAGE_RETRIES = int(os.getenv("IMAGE_STORAGE_RETRIES", "2"))
+IMAGE_STORAGE_RETRY_BACKOFF_SECONDS = float(os.getenv("IMAGE_STORAGE_RETRY_BACKOFF_SECONDS", "0.5"))
+LOCAL_UPLOAD_DIR = os.getenv("LOCAL_UPLOAD_DIR", "uploads")
+CLOUDINARY_FOLDER = os.getenv("CLOUDINARY_FOLDER", "template_sharing")
+
+class StorageError(Exception):
+    """Raised when a storage backend cannot store or delete an image"""
+
+class ImageStorage(ABC):
+    """
+    Where template images live. save/save_bytes return the fields stored on the
+    template: {"image_id": key, "image_url": url, "image_backend": name}. Templates
+    remember their backend so images keep resolving after a deployment switches;
+    templates without image_backend predate the setting and live in GridFS.
+    """
+    name = ""
+
+    @abstractmethod
+    async def save(self, upload_file: UploadFile) -> dict:
+        ...
+
+    @abstractmethod
+    async def save_bytes(self, data: bytes, filename: str, content_type: str) -> dict:
+        ...
+
+    @abstractmethod
+    async def release(self, image_id: str):
+        """Drop the template's reference to an image previously returned by save"""
+
+    def _fields(self, image_id: str, image_url: str) -> dict:
+        return {"image_id": image_id, "image_url": image_url, "image_backend": self.name}
+
+class GridFSImageStorage(ImageStorage):
+    """Deduplicated GridFS originals plus variants, served by GET /api/images/{id}"""
+    name = "gridfs"
+
+    async def save(self, upload_file: UploadFile) -> dict:
+        from app.utils.image_upload import store_upload
+        image_id = await store_upload(upload_file)
+        return self._fields(str(image_id), image_url_for(image_id))
+
+    async def save_bytes(self, data: bytes, filename: str, content_type: str) -> dict:
+        from app.utils.image_variants import store_image_with_variants
+        image_id = await store_image_with_variants(data, filename, content_type)
+        return self._fields(str(image_id), image_url_for(image_id))
+
+    async def release(self, image_id: str):
+        from app.core.cache import image_cache
+        from app.core.database import release_image
+        image_cache.invalidate(image_id)
+        await release_image(image_id)
+
+class LocalImageStorage(ImageStorage):
+    """Files under the uploads/ directory, served by the /uploads static mount"""
+    name = "local"
+
+    def __init__(self, directory: str = LOCAL_UPLOAD_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    async def save(self, upload_file: UploadFile) -> dict:
+        content_type, chunks = await read_upload_chunks(upload_file)
+        key = _new_key(content_type)
+        path = os.path.join(self.directory, key)
+        handle = await asyncio.to_thread(open, path, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(remove_file, path)
+            raise
+        await asyncio.to_thread(handle.close)
+        return self._fields(key, self._url(key))
+
+    async def save_bytes(self, data: bytes, filename: str, content_type: str) -> dict:
+        key = _new_key(content_type)
+        await asyncio.to_thread(_write_file, os.path.join(self.directory, key), data)
+        return self._fields(key, self._url(key))
+
+    async def release(self, image_id: str):
+        # Keys are generated by save; never follow anything that looks like a path
+        if os.path.basename(image_id) == image_id:
+            await asyncio.to_thread(remove_file, os.path.join(self.directory, image_id))
+
+    def _url(self, key: str) -> str:
+        base_url = os.getenv("BASE_URL", "http://localhost:8000")
+        return f"{base_url}/uploads/{key}"
+
+class CloudinaryImageStorage(ImageStorage):
+    """
+    Cloudinary uploads. The SDK is synchronous, so every call runs in a worker thread
+    with a per-attempt timeout and retries; failures raise StorageError. A timed out
+    attempt keeps running in its thread, so every attempt of one upload writes the
+    same public_id (overwrite=True) and at most one asset results.
+    """
+    name = "cloudinary"
+
+    def __init__(
+        self,
+        timeout: float = IMAGE_STORAGE_TIMEOUT_SECONDS,
+        retries: int = IMAGE_STORAGE_RETRIES,
+        backoff: float = IMAGE_STORAGE_RETRY_BACKOFF_SECONDS
+    ):
+        import cloudinary
+
+        credentials = (
+            os.getenv("CLOUDINARY_CLOUD_NAME"),
+            os.getenv("CLOUDINARY_API_KEY"),
+            os.getenv("CLOUDINARY_API_SECRET")
+        )
+        if not all(credentials):
+            raise StorageError("Cloudinary storage requires CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET")
+        cloudinary.config(cloud_name=credentials[0], api_key=credentials[1], api_secret=credentials[2])
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    async def save(self, upload_file: UploadFile) -> dict:
+        _, chunks = await read_upload_chunks(upload_file)
+        # The SDK reads the whole file into memory anyway. Immutable bytes also let a timed
+        # out attempt that is still running and its retry read the image independently
+        data = b"".join([chunk async for chunk in chunks])
+        return await self._upload(data)
+
+    async def save_bytes(self, data: bytes, filename: str, content_type: str) -> dict:
+        return await self._upload(data)
+
+    async def release(self, image_id: str):
+        import cloudinary.uploader
+        await self._call(lambda: cloudinary.uploader.destroy(image_id, resource_type="image", timeout=self.timeout))
+
+    async def _upload(self, data: bytes) -> dict:
+        import cloudinary.uploader
+
+        # Chosen once so that retries replace the asset instead of adding another
+        public_id = uuid.uuid4().hex
+
+        def upload():
+            return cloudinary.uploader.upload(
+                data,
+                folder=CLOUDINARY_FOLDER,
+                public_id=public_id,
+                overwrite=True,
+                resource_type="image",
+                timeout=self.timeout
+            )
+
+        result = await self._call(upload)
+        return self._fields(result["public_id"], result["secure_url"])
+
+    async def _call(self, func):
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                return await asyncio.wait_for(asyncio.to_thread(func), timeout=self.timeout)
+            except Exception as e:
+                last_error = e
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * (2 ** attempt))
+        raise StorageError(f"Cloudinary request failed after {self.retries + 1} attempts: {last_error}")
+
+class MemoryImageStorage(ImageStorage):
+    """In-process stand-in for tests and local experiments; nothing is persisted"""
+    name = "memory"
+
+    def __init__(self):
+        self.images: Dict[str, Tuple[bytes, str]] = {}
+
+    async def save(self, upload_file: UploadFile) -> dict:
+        content_type, chunks = await read_upload_chunks(upload_file)
+        data = b"".join([chunk async for chunk in chunks])
+        return await self.save_bytes(data, upload_file.filename, content_type)
+
+    async def save_bytes(self, data: bytes, filename: str, content_type: str) -> dict:
+        key = _new_key(content_type)
+        self.images[key] = (data, content_type)
+        return self._fields(key, f"memory://{key}")
+
+    async def release(self, image_id: str):
+        self.images.pop(image_id, None)
+
+BACKENDS = {
+    "gridfs": GridFSImageStorage,
+    "local": LocalImageStorage,
+    "cloudinary": CloudinaryImageStorage,
+    "memory": MemoryImageStorage,
+}
+
+_storages: Dict[str, ImageStorage] = {}
+
+def get_image_storage(name: Optional[str] = None) -> ImageStorage:
+    """Storage backend by name, defaulting to the one configured for this deployment"""
+    name = (name or IMAGE_STORAGE_BACKEND).lower()
+    if name not in _storages:
+        if name not in BACKENDS:
+            raise StorageError(f"Unknown image storage backend: {name}")
+        _storages[name] = BACKENDS[name]()
+    return _storages[name]
+
+def set_image_storage(storage: ImageStorage):
+    """Install a backend instance as this process's default, e.g. a MemoryImageStorage in tests"""
+    global IMAGE_STORAGE_BACKEND
+    _storages[storage.name] = storage
+    IMAGE_STORAGE_BACKEND = storage.name
+
+async def release_template_image(template: dict, image_id: Optional[str]):
+    """Release a template's image with the backend that stored it"""
+    if image_id:
+        await get_image_storage(template.get("image_backend", "gridfs")).release(image_id)
+
+def _new_key(content_type: str) -> str:
+    extension = mimetypes.guess_extension(content_type) or ""
+    return f"{uuid.uuid4().hex}{extension}"
+
+def _write_file(path: str, data: bytes):
+    with open(path, "wb") as handle:
+        handle.write(data)
@@ -0,0 +1,116 @@
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, Optional, Tuple
+from fastapi import HTTPException
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Image ids never point at different bytes, so clients may cache them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `Range: bytes=start-end` header.
+    Args:
+        range_header: Raw header value, or None.
+        size: Total length of the resource in bytes.
+    Returns:
+        Inclusive (start, end) offsets, or None when the whole body should be sent.
+    """
+    if not range_header:
+        return None
+
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        # Multi-range and non-byte units are not supported; serve the full body
+        return None
+
+    start_str, end_str = match.groups()
+    if not start_str and not end_str:
+        return None
+
+    if not start_str:
+        # Suffix range: the last N bytes
+        length = int(end_str)
+        if length == 0:
+            raise_range_not_satisfiable(size)
+        start, end = max(size - length, 0), size - 1
+    else:
+        start = int(start_str)
+        end = int(end_str) if end_str else size - 1
+        end = min(end, size - 1)
+
+    if start >= size or start > end:
+        raise_range_not_satisfiable(size)
+
+    return start, end
+
+def raise_range_not_satisfiable(size: int):
+    raise HTTPException(
+        status_code=416,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{size}"}
+    )
+
+async def iter_grid_out(grid_out, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Yield a GridFS file chunk by chunk, limited to the inclusive byte range [start, end]"""
+    if end is None:
+        end = grid_out.length - 1
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.read(min(grid_out.chunk_size, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+def image_etag(file_doc: dict) -> str:
+    """Strong ETag from the stored content hash, or a weak id-based one for older files"""
+    sha256 = (file_doc.get("metadata") or {}).get("sha256")
+    if sha256:
+        return f'"{sha256}"'
+    return f'W/"{file_doc["_id"]}-{file_doc.get("length", 0)}"'
+
+def image_last_modified(file_doc: dict) -> Optional[datetime]:
+    """GridFS uploadDate as an aware UTC datetime truncated to whole seconds"""
+    upload_date = file_doc.get("uploadDate")
+    if upload_date is None:
+        return None
+    if upload_date.tzinfo is None:
+        upload_date = upload_date.replace(tzinfo=timezone.utc)
+    return upload_date.replace(microsecond=0)
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    """Validator and Cache-Control headers shared by 200, 206 and 304 image responses"""
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+def is_not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    etag: str,
+    last_modified: Optional[datetime]
+) -> bool:
+    """Evaluate conditional request headers; If-None-Match takes precedence per RFC 9110"""
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" and "x" match each other
+        opaque = etag.removeprefix("W/")
+        candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+        return opaque in candidates
+
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+
+    return False
@@ -1,64 +1,167 @@
 import os
-import base64
-import time
-from typing import Optional
+from typing import AsyncIterator, Optional, Tuple
 from fastapi import UploadFile, HTTPException
-import cloudinary
-import cloudinary.uploader
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Configure Cloudinary (optional - for production image hosting)
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
+# Largest accepted image upload; bigger upload requests are cut off with 413 by UploadSizeLimitMiddleware
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Read size per upload chunk; also the most of an upload held in memory at once
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(256 * 1024)))
+# Room for the other form fields and multipart framing of an upload request
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+def image_url_for(image_id) -> str:
+    """Public URL of an image served by GET /api/images/{image_id}"""
+    base_url = os.getenv("BASE_URL", "http://localhost:8000")
+    return f"{base_url}/api/images/{image_id}"
 
 async def save_upload_file(upload_file: UploadFile) -> str:
     """
-    Save uploaded file and return the file path or URL.
-    For simplicity, we'll save files locally. In production, use cloud storage.
+    Save an uploaded image with the configured storage backend and return its URL.
     """
+    from app.utils.image_storage import get_image_storage
     try:
-        # Store image in MongoDB and return full image URL
-        from app.core.database import store_image_in_mongo
-        image_bytes = await upload_file.read()
-        image_id = await store_image_in_mongo(image_bytes, upload_file.filename, upload_file.content_type)
-        
-        # Generate full URL
-        base_url = os.getenv("BASE_URL", "http://localhost:8001")
-        return f"{base_url}/api/images/{image_id}"
+        stored = await get_image_storage().save(upload_file)
+        return stored["image_url"]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
 
 async def upload_to_cloudinary(upload_file: UploadFile) -> Optional[str]:
     """
     Upload file to Cloudinary and return the URL.
-    This is optional and requires Cloudinary credentials.
+    Failures are raised instead of silently storing the image elsewhere.
     """
-    try:
-        if not all([
-            os.getenv("CLOUDINARY_CLOUD_NAME"),
-            os.getenv("CLOUDINARY_API_KEY"),
-            os.getenv("CLOUDINARY_API_SECRET")
-        ]):
-            # Fall back to local storage
-            return await save_upload_file(upload_file)
-        
-        # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            upload_file.file,
-            folder="template_sharing",
-            resource_type="image"
-        )
-        return result.get("secure_url")
-    except Exception as e:
-        # Fall back to local storage
-        return await save_upload_file(upload_file)
+    from app.utils.image_storage import CloudinaryImageStorage
+    stored = await CloudinaryImageStorage().save(upload_file)
+    return stored["image_url"]
+
+ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp"]
 
 def validate_image_file(upload_file: UploadFile) -> bool:
     """Validate if the uploaded file is an image"""
-    allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/gif", "image/webp"]
-    return upload_file.content_type in allowed_types
+    return upload_file.content_type in ALLOWED_IMAGE_TYPES
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Detect the image type from its leading magic bytes, ignoring the client's content type"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+async def read_upload_chunks(upload_file: UploadFile) -> Tuple[str, AsyncIterator[bytes]]:
+    """
+    Sniff an upload's type from its first chunk and return it with an iterator over
+    the upload's chunks that raises 413 once MAX_UPLOAD_BYTES is exceeded.
+    Invalid or oversized uploads are rejected before they are fully consumed.
+    """
+    first_chunk = await upload_file.read(UPLOAD_CHUNK_BYTES)
+    content_type = sniff_image_type(first_chunk)
+    if content_type is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid image file. Only JPEG, PNG, GIF, and WebP are allowed."
+        )
+
+    async def chunks():
+        chunk = first_chunk
+        total = 0
+        while chunk:
+            total += len(chunk)
+            if total > MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Image exceeds the maximum upload size of {MAX_UPLOAD_BYTES} bytes"
+                )
+            yield chunk
+            chunk = await upload_file.read(UPLOAD_CHUNK_BYTES)
+
+    return content_type, chunks()
+
+async def store_upload(upload_file: UploadFile):
+    """
+    Stream an uploaded image into GridFS chunk by chunk and generate its variants.
+    Returns:
+        ObjectId of the stored (or reused identical) image.
+    """
+    from app.core.database import store_image_stream
+    from app.utils.image_variants import generate_stored_variants
+
+    content_type, chunks = await read_upload_chunks(upload_file)
+    image_id, created = await store_image_stream(chunks, upload_file.filename, content_type)
+    if created:
+        await generate_stored_variants(image_id, upload_file.filename)
+    return image_id
+
+def is_image_upload(method: str, path: str) -> bool:
+    """Template create and update requests, which carry one image upload"""
+    if method == "POST":
+        return path.rstrip("/") == "/api/templates"
+    return method == "PUT" and path.startswith("/api/templates/")
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware bounding the request body of image uploads before it is parsed.
+    FastAPI spools the whole multipart body to disk before the route runs, so the
+    checks in read_upload_chunks come too late to spare the bandwidth and disk.
+    Requests whose Content-Length is above the limit are rejected with 413 without
+    reading the body; chunked bodies are cut off with 413 once they exceed it.
+    """
+
+    def __init__(self, app, max_body_bytes: int = MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_image_upload(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        too_large = HTTPException(
+            status_code=413,
+            detail=f"Image exceeds the maximum upload size of {MAX_UPLOAD_BYTES} bytes"
+        )
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._reject(too_large, scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Re-raised by FastAPI's body parsing and rendered as 413
+                    raise too_large
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            if e is not too_large or response_started:
+                raise
+            await self._reject(too_large, scope, receive, send)
+
+    async def _reject(self, error: HTTPException, scope, receive, send):
+        response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"})
+        await response(scope, receive, send)
@@ -0,0 +1,172 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Target widths of the resized variants; images are never upscaled
+VARIANT_WIDTHS = {"thumbnail": 480, "medium": 1200}
+# Full-size WebP re-encode of the original
+WEBP_VARIANT = "webp"
+ORIGINAL_VARIANT = "original"
+VARIANT_NAMES = (ORIGINAL_VARIANT, WEBP_VARIANT, *VARIANT_WIDTHS)
+
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def _mp_context():
+    # Forking a process that runs an event loop and Mongo client threads can deadlock
+    # the child; forkserver (spawn where unavailable) starts workers from a clean interpreter
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+def get_image_executor() -> ProcessPoolExecutor:
+    """Process pool for CPU-bound resizing, created on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=_mp_context())
+    return _executor
+
+def shutdown_image_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def run_in_image_executor(func, *args):
+    """
+    Run func in the image pool. A pool whose worker died (e.g. killed for memory while
+    decoding) is broken for good, so it is replaced and the call retried once.
+    """
+    global _executor
+    loop = asyncio.get_running_loop()
+    executor = get_image_executor()
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        # Concurrent callers see the same broken pool; only the first replaces it
+        if _executor is executor:
+            print("Image worker pool is broken; starting a new one")
+            _executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(get_image_executor(), func, *args)
+
+def render_variants(image_bytes: bytes) -> dict:
+    """
+    Decode an image and encode its WebP variants. Runs in a worker process.
+    Returns:
+        {"width": int, "height": int, "variants": {name: (width, height, webp_bytes)}}
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+        width, height = image.size
+        targets = {WEBP_VARIANT: width}
+        targets.update({name: w for name, w in VARIANT_WIDTHS.items() if w < width})
+
+        variants = {}
+        for name, target_width in targets.items():
+            resized = image
+            if target_width < width:
+                target_height = max(1, round(height * target_width / width))
+                resized = image.resize((target_width, target_height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+            variants[name] = (resized.width, resized.height, buffer.getvalue())
+
+    return {"width": width, "height": height, "variants": variants}
+
+async def store_image_with_variants(image_bytes: bytes, filename: str, content_type: str):
+    """
+    Store an uploaded image and its resized/WebP variants.
+    Variant ids are recorded in the original's GridFS metadata so get_image can
+    resolve ?variant= and ?w= from the file document it already loads.
+    Returns:
+        ObjectId of the original image.
+    """
+    from app.core.database import store_image_content
+
+    image_id, created = await store_image_content(image_bytes, filename, content_type)
+    if created:
+        # Reused originals already have their variants
+        await attach_variants(image_id, image_bytes, filename)
+    return image_id
+
+async def generate_stored_variants(image_id, filename: str):
+    """Render variants for an original that was streamed into GridFS"""
+    from app.core.database import get_image_bucket
+
+    bucket = await get_image_bucket()
+    grid_out = await bucket.open_download_stream(image_id)
+    # Decoding needs the whole image; uploads are capped by MAX_UPLOAD_BYTES
+    image_bytes = await grid_out.read()
+    await attach_variants(image_id, image_bytes, filename)
+
+async def attach_variants(image_id, image_bytes: bytes, filename: str):
+    """Render and store the variants of a new original and record them in its metadata"""
+    from app.core.database import get_database, store_image_in_mongo, IMAGE_BUCKET_NAME
+
+    try:
+        rendered = await run_in_image_executor(render_variants, image_bytes)
+    except Exception as e:
+        # Undecodable images are still served as uploaded, just without variants
+        print(f"Could not generate variants for image {image_id}: {e}")
+        return
+
+    base_name = os.path.splitext(filename or "image")[0]
+    variants_meta: Dict[str, dict] = {}
+    for name, (width, height, data) in rendered["variants"].items():
+        variant_id = await store_image_in_mongo(
+            data,
+            f"{base_name}.{name}.webp",
+            "image/webp",
+            extra_metadata={"parent_id": image_id, "variant": name, "width": width, "height": height}
+        )
+        variants_meta[name] = {"id": str(variant_id), "width": width, "height": height}
+
+    db_instance = await get_database()
+    await db_instance[f"{IMAGE_BUCKET_NAME}.files"].update_one(
+        {"_id": image_id},
+        {"$set": {
+            "metadata.width": rendered["width"],
+            "metadata.height": rendered["height"],
+            "metadata.variants": variants_meta
+        }}
+    )
+
+def select_variant(file_doc: dict, variant: Optional[str], width: Optional[int]) -> Optional[str]:
+    """
+    Pick the variant image id for a ?variant= or ?w= request.
+    Returns:
+        Variant image id, or None to serve the original.
+    """
+    variants = (file_doc.get("metadata") or {}).get("variants") or {}
+
+    if variant:
+        if variant == ORIGINAL_VARIANT or variant not in variants:
+            return None
+        return variants[variant]["id"]
+
+    if width:
+        # Smallest variant at least as wide as requested, else the full-size WebP
+        candidates = sorted(
+            (meta for name, meta in variants.items() if name != WEBP_VARIANT and meta["width"] >= width),
+            key=lambda meta: meta["width"]
+        )
+        if candidates:
+            return candidates[0]["id"]
+        if WEBP_VARIANT in variants:
+            return variants[WEBP_VARIANT]["id"]
+
+    return None
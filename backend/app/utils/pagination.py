@@ -0,0 +1,64 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Fields a client may request through `fields=`; `id` (or `_id`) selects Mongo's `_id`,
+# which is returned under `_id` like the detail endpoint
+TEMPLATE_FIELDS = ("id", "title", "description", "image_url", "created_by", "created_at", "updated_at")
+
+def encode_cursor(created_at: datetime, doc_id: ObjectId) -> str:
+    """Encode the (created_at, _id) position of the last returned document"""
+    raw = f"{created_at.isoformat()}|{doc_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, doc_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(doc_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def keyset_filter(cursor: Optional[str]) -> dict:
+    """Build the query that resumes listing right after the cursor position"""
+    if not cursor:
+        return {}
+    created_at, doc_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "_id": {"$gt": doc_id}}
+        ]
+    }
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Validate a comma separated `fields=` value against TEMPLATE_FIELDS"""
+    if not fields:
+        return TEMPLATE_FIELDS
+    requested = tuple(dict.fromkeys(
+        "id" if f.strip() == "_id" else f.strip() for f in fields.split(",") if f.strip()
+    ))
+    unknown = [f for f in requested if f not in TEMPLATE_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown) or fields}. Allowed: {', '.join(TEMPLATE_FIELDS)}"
+        )
+    return requested
+
+def build_projection(fields: Tuple[str, ...]) -> dict:
+    """Mongo projection for the requested fields plus the keyset columns"""
+    projection = {f: 1 for f in fields if f != "id"}
+    # created_at and _id are always needed to build the next cursor
+    projection["created_at"] = 1
+    projection["_id"] = 1
+    return projection
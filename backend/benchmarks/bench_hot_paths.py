@@ -0,0 +1,257 @@
+"""
+Throughput and latency of the API hot paths under concurrency.
+
+Seeds a dataset (templates plus images of mixed sizes), then drives each scenario
+(list, get, image, login, create) through the ASGI app in-process with an async
+HTTP client and reports requests/s and p50/p95/p99 per scenario as JSON.
+
+By default MongoDB is replaced by mongomock-motor. GridFS does not work on the stand-in,
+so images are seeded into the legacy `images` collection and uploads go to the memory
+storage backend. Pass --mongo-url to use a real mongod: a throwaway database is created
+(and dropped afterwards), images go to GridFS and uploads use the configured backend.
+Absolute numbers are only comparable between runs with the same settings.
+
+Usage (from backend/):
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_hot_paths --dataset small --output results.json
+    python -m benchmarks.bench_hot_paths --dataset small --compare results.json
+"""
+import argparse
+import os
+
+# Rate limits and admission caps would turn the load into 429/503s; measure the paths behind them.
+# Set before the app modules are imported, which read them once.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+import asyncio
+import io
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+import app.core.database as database
+from app.core import auth as core_auth
+from benchmarks.common import environment, latency_summary
+
+DATASETS = {"small": 1_000, "large": 100_000}
+SCENARIOS = ("list", "get", "image", "login", "create")
+# Image sizes in bytes and how often each occurs (thumbnails dominate)
+IMAGE_SIZES = ((8 * 1024, 50), (64 * 1024, 30), (512 * 1024, 15), (2 * 1024 * 1024, 5))
+ADMIN_EMAIL = "bench-admin@example.com"
+USER_EMAIL = "bench-user@example.com"
+PASSWORD = "bench-password"
+INSERT_BATCH = 1_000
+
+def png_bytes(size: int, rng: random.Random) -> bytes:
+    """PNG signature followed by filler; the image route never decodes what it serves"""
+    return b"\x89PNG\r\n\x1a\n" + rng.randbytes(max(size - 8, 0))
+
+def upload_png() -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 80, 40)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+async def install_database(mongo_url):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from app.core.indexes import apply_indexes
+
+        client = AsyncIOMotorClient(mongo_url, **database.client_options())
+        database.use_database(client, client[f"bench_{uuid.uuid4().hex[:8]}"])
+        await apply_indexes(database.db.database)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        from app.utils.image_storage import MemoryImageStorage, set_image_storage
+
+        client = AsyncMongoMockClient()
+        database.use_database(client, client["benchmark"])
+        set_image_storage(MemoryImageStorage())
+
+async def seed(templates: int, images: int, mongo_url, rng: random.Random) -> dict:
+    db = database.db.database
+    password = core_auth.get_password_hash(PASSWORD)
+    now = datetime.now(timezone.utc)
+    users = await db.users.insert_many([
+        {"email": ADMIN_EMAIL, "username": "bench-admin", "role": "admin", "password": password, "created_at": now},
+        {"email": USER_EMAIL, "username": "bench-user", "role": "user", "password": password, "created_at": now},
+    ])
+
+    sizes, weights = zip(*IMAGE_SIZES)
+    image_ids = []
+    for _ in range(images):
+        data = png_bytes(rng.choices(sizes, weights)[0], rng)
+        if mongo_url:
+            image_ids.append(str(await database.store_image_in_mongo(data, "bench.png", "image/png")))
+        else:
+            result = await db.images.insert_one({"data": data, "content_type": "image/png"})
+            image_ids.append(str(result.inserted_id))
+
+    template_ids = []
+    for start in range(0, templates, INSERT_BATCH):
+        batch = []
+        for i in range(start, min(start + INSERT_BATCH, templates)):
+            image_id = rng.choice(image_ids) if image_ids else None
+            created_at = now - timedelta(seconds=templates - i)
+            batch.append({
+                "title": f"Template {i}",
+                "title_lower": f"template {i}",
+                "description": f"Seeded template number {i} for benchmarks",
+                "image_id": image_id,
+                "image_url": f"http://bench/api/images/{image_id}",
+                "created_by": str(users.inserted_ids[0]),
+                "created_at": created_at,
+                "updated_at": created_at,
+            })
+        result = await db.templates.insert_many(batch)
+        template_ids.extend(str(i) for i in result.inserted_ids)
+
+    return {"template_ids": template_ids, "image_ids": image_ids}
+
+def scenario_requests(name: str, dataset: dict, rng: random.Random, png: bytes):
+    """Return a coroutine factory issuing one request of the scenario"""
+    admin = {"Authorization": f"Bearer {core_auth.create_access_token({'sub': ADMIN_EMAIL, 'role': 'admin'})}"}
+    user = {"Authorization": f"Bearer {core_auth.create_access_token({'sub': USER_EMAIL, 'role': 'user'})}"}
+
+    def request(client: httpx.AsyncClient):
+        if name == "list":
+            return client.get("/api/templates/?limit=50", headers=user)
+        if name == "get":
+            return client.get(f"/api/templates/{rng.choice(dataset['template_ids'])}", headers=user)
+        if name == "image":
+            return client.get(f"/api/images/{rng.choice(dataset['image_ids'])}")
+        if name == "login":
+            return client.post("/api/auth/login", json={"email": USER_EMAIL, "password": PASSWORD})
+        return client.post(
+            "/api/templates",
+            data={"title": "Benchmark upload", "description": "Created by the benchmark"},
+            files={"image": ("bench.png", png, "image/png")},
+            headers=admin
+        )
+    return request
+
+async def run_scenario(client, request, requests: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await request(client)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            # The in-memory stand-in never suspends; let the other workers interleave
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+        "status": statuses,
+    }
+
+async def run(args) -> dict:
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    templates = args.templates or DATASETS[args.dataset]
+    await install_database(args.mongo_url)
+    try:
+        seed_started = time.perf_counter()
+        dataset = await seed(templates, args.images, args.mongo_url, rng)
+        seed_seconds = time.perf_counter() - seed_started
+
+        png = upload_png()
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            for name in args.scenarios:
+                request = scenario_requests(name, dataset, rng, png)
+                # Warm caches and code paths so the first measured requests are not outliers
+                for _ in range(min(args.warmup, args.requests)):
+                    await request(client)
+                # bcrypt makes logins orders of magnitude slower; keep their count bounded
+                count = min(args.requests, args.login_requests) if name == "login" else args.requests
+                results[name] = await run_scenario(client, request, count, args.concurrency)
+                print(f"{name}: {results[name]['throughput_rps']} req/s, p95 {results[name]['latency_ms'].get('p95')} ms", file=sys.stderr)
+    finally:
+        if args.mongo_url and not args.keep:
+            await database.db.client.drop_database(database.db.database.name)
+
+    return {
+        "benchmark": "hot_paths",
+        "environment": environment(),
+        "settings": {
+            "backend": "mongodb" if args.mongo_url else "mongomock",
+            "templates": templates,
+            "images": args.images,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Scenarios whose p95 latency grew or throughput dropped by more than threshold percent"""
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        p95, p95_before = result["latency_ms"]["p95"], before["latency_ms"]["p95"]
+        if p95_before and (p95 - p95_before) / p95_before * 100 > threshold:
+            regressions.append(f"{name}: p95 {p95_before} -> {p95} ms")
+        rps, rps_before = result["throughput_rps"], before["throughput_rps"]
+        if rps_before and (rps_before - rps) / rps_before * 100 > threshold:
+            regressions.append(f"{name}: throughput {rps_before} -> {rps} req/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", choices=DATASETS, default="small", help="small = 1k templates, large = 100k")
+    parser.add_argument("--templates", type=int, help="Override the dataset's template count")
+    parser.add_argument("--images", type=int, default=200, help="Seeded images (mixed sizes)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="Cap for the login scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each scenario")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for data and request mix")
+    parser.add_argument("--mongo-url", help="Use this MongoDB instead of mongomock-motor")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database (--mongo-url)")
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--compare", help="Baseline JSON; exit 1 on regressions beyond --threshold")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(result, json.load(handle), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
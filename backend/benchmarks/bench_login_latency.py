@@ -0,0 +1,129 @@
+"""
+Latency of an unrelated endpoint while logins are hammering bcrypt.
+
+Runs the ASGI app in-process against an in-memory MongoDB stand-in (mongomock-motor),
+keeps several login loops running, and samples GET /api/templates/public at the same time.
+Compare the default offloaded hashing with --inline, which restores the old
+behaviour of hashing directly on the event loop.
+
+Usage (from backend/):
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.bench_login_latency --concurrency 8 --probes 200
+"""
+import argparse
+import os
+
+# Rate limits and admission caps would turn the load into 429/503s; measure the paths behind them.
+# Set before the app modules are imported, which read them once.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+
+import app.core.database as database
+from app.core import auth as core_auth
+from app.routes import auth as auth_routes
+from benchmarks.common import percentile
+
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+PROBE_INTERVAL = 0.02
+
+def use_inline_hashing():
+    """Swap the async hashing helpers for versions that block the event loop"""
+    async def verify_inline(plain, hashed):
+        return core_auth.verify_password(plain, hashed)
+
+    async def hash_inline(password):
+        return core_auth.get_password_hash(password)
+
+    auth_routes.verify_password_async = verify_inline
+    auth_routes.get_password_hash_async = hash_inline
+
+async def seed():
+    client = AsyncMongoMockClient()
+    database.use_database(client, client["benchmark"])
+    await database.db.database.users.insert_one({
+        "email": EMAIL,
+        "username": "bench",
+        "role": "user",
+        "password": core_auth.get_password_hash(PASSWORD),
+        "created_at": datetime.now(timezone.utc),
+    })
+    now = datetime.now(timezone.utc)
+    await database.db.database.templates.insert_many([
+        {"title": f"t{i}", "description": "d", "image_url": None, "created_by": "bench",
+         "created_at": now, "updated_at": now}
+        for i in range(50)
+    ])
+
+async def run(concurrency: int, probes: int) -> dict:
+    from app.main import app
+
+    await seed()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        login_status = []
+        probe_latencies = []
+        probing = True
+
+        async def login_worker():
+            # Keep logging in for as long as the probe is measuring
+            while probing:
+                response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+                login_status.append(response.status_code)
+                # The in-memory stand-in never suspends, so yield explicitly between logins
+                await asyncio.sleep(0.05 if response.status_code == 429 else 0)
+
+        async def probe():
+            # Open-loop schedule: latency counts from when the probe *should* have
+            # started, so time the event loop spends blocked is included
+            nonlocal probing
+            await asyncio.sleep(0.2)
+            first = time.perf_counter()
+            for i in range(probes):
+                scheduled = first + i * PROBE_INTERVAL
+                await asyncio.sleep(max(0, scheduled - time.perf_counter()))
+                await client.get("/api/templates/public?limit=20")
+                probe_latencies.append((time.perf_counter() - scheduled) * 1000)
+            probing = False
+
+        started = time.perf_counter()
+        await asyncio.gather(probe(), *(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "login_status": {str(code): login_status.count(code) for code in sorted(set(login_status))},
+        "probe_ms": {
+            "p50": round(statistics.median(probe_latencies), 2),
+            "p95": round(percentile(probe_latencies, 95), 2),
+            "p99": round(percentile(probe_latencies, 99), 2),
+            "max": round(max(probe_latencies), 2),
+        },
+        "elapsed_s": round(elapsed, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent login loops")
+    parser.add_argument("--probes", type=int, default=200, help="Sequential probe requests")
+    parser.add_argument("--inline", action="store_true", help="Hash on the event loop (pre-offload behaviour)")
+    args = parser.parse_args()
+
+    if args.inline:
+        use_inline_hashing()
+
+    result = asyncio.run(run(args.concurrency, args.probes))
+    result["mode"] = "inline" if args.inline else "offloaded"
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+CPU cost of turning a page of template documents into a JSON response body.
+
+Compares the previous path (a TemplateListItem per document, validation against
+response_model=List[TemplateListItem], jsonable_encoder and json.dumps as done by
+FastAPI's JSONResponse) with the fast path used by the templates routes now (plain
+dicts projected from the documents, encoded by orjson with ObjectId and datetime
+handled by the encoder). No database is involved; documents are synthetic.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --page-size 200 --rounds 200
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.core.serialization import dumps
+from app.models.models import TemplateListItem
+from app.routes.templates import to_list_item
+from app.utils.pagination import TEMPLATE_FIELDS
+from benchmarks.common import environment, latency_summary
+
+def make_documents(count: int) -> list:
+    # Motor returns naive UTC datetimes unless tz_aware is set
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    creator = str(ObjectId())
+    return [
+        {
+            "_id": ObjectId(),
+            "title": f"Template {i}",
+            "description": f"Description of template number {i}, long enough to look like a real one",
+            "image_url": f"https://example.com/api/images/{ObjectId()}",
+            "created_by": creator,
+            "created_at": now - timedelta(seconds=i),
+            "updated_at": now - timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+
+LIST_ADAPTER = TypeAdapter(List[TemplateListItem])
+
+def pydantic_path(docs: list, selected: tuple) -> bytes:
+    items = []
+    for template in docs:
+        item = {f: template.get(f) for f in selected if f != "id"}
+        if "id" in selected:
+            item["id"] = str(template["_id"])
+        items.append(TemplateListItem(**item))
+    validated = LIST_ADAPTER.validate_python(items, from_attributes=True)
+    content = jsonable_encoder(validated, exclude_unset=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+def fast_path(docs: list, selected: tuple) -> bytes:
+    return dumps([to_list_item(template, selected) for template in docs])
+
+PATHS = {"pydantic": pydantic_path, "orjson": fast_path}
+
+def measure(func, docs: list, selected: tuple, rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(docs, selected)
+        timings.append((time.perf_counter() - started) * 1000)
+    summary = latency_summary(timings)
+    summary["per_document_us"] = round(1000 * summary["mean"] / len(docs), 3)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=200, help="Documents per serialized page")
+    parser.add_argument("--rounds", type=int, default=200, help="Measured serializations per path")
+    parser.add_argument("--fields", help="Comma separated subset of fields, as in ?fields=")
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    args = parser.parse_args()
+
+    docs = make_documents(args.page_size)
+    selected = tuple(args.fields.split(",")) if args.fields else TEMPLATE_FIELDS
+
+    # Both paths must produce the same document before their speed means anything
+    if json.loads(pydantic_path(docs, selected)) != json.loads(fast_path(docs, selected)):
+        raise SystemExit("Serialization paths disagree")
+
+    results = {}
+    for name, func in PATHS.items():
+        func(docs, selected)
+        results[name] = measure(func, docs, selected, args.rounds)
+
+    result = {
+        "benchmark": "serialization",
+        "environment": environment(),
+        "settings": {"page_size": args.page_size, "rounds": args.rounds, "fields": list(selected)},
+        "results": results,
+        "speedup": round(results["pydantic"]["mean"] / results["orjson"]["mean"], 2),
+    }
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
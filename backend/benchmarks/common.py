@@ -0,0 +1,32 @@
+"""Shared helpers for the benchmark scripts"""
+import platform
+import statistics
+import subprocess
+from typing import List
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def latency_summary(latencies_ms: List[float]) -> dict:
+    """p50/p95/p99/max/mean of a list of latencies in milliseconds"""
+    if not latencies_ms:
+        return {}
+    return {
+        "p50": round(statistics.median(latencies_ms), 2),
+        "p95": round(percentile(latencies_ms, 95), 2),
+        "p99": round(percentile(latencies_ms, 99), 2),
+        "max": round(max(latencies_ms), 2),
+        "mean": round(statistics.fmean(latencies_ms), 2),
+    }
+
+def environment() -> dict:
+    """Where a result came from, so JSON files from different commits can be compared"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.machine()}
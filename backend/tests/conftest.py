@@ -0,0 +1,16 @@
+import os
+
+import pytest
+
+from app.core import database
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """An in-memory database installed as the app's database for one test"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    client = mongomock_motor.AsyncMongoMockClient()
+    db = client["test"]
+    monkeypatch.setattr(database.db, "client", client)
+    monkeypatch.setattr(database.db, "database", db)
+    monkeypatch.setattr(database.db, "pid", os.getpid())
+    return db
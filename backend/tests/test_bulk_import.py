@@ -0,0 +1,46 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import pytest
+
+from app.utils import image_storage
+from app.utils.bulk_import import import_archive
+from app.utils.image_storage import MemoryImageStorage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+def make_archive(manifest) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("manifest.json", json.dumps(manifest))
+        archive.writestr("a.png", PNG)
+    buffer.seek(0)
+    return buffer
+
+@pytest.fixture
+def storage(mongo_db, monkeypatch):
+    memory = MemoryImageStorage()
+    monkeypatch.setattr(image_storage, "_storages", {"memory": memory})
+    monkeypatch.setattr(image_storage, "IMAGE_STORAGE_BACKEND", "memory")
+    return memory
+
+def test_malformed_and_duplicate_entries_fail_individually(mongo_db, storage):
+    item = {"key": "one", "title": "T", "description": "D", "image": "a.png"}
+    manifest = ["text", None, 5, item, dict(item, title="Again"), {"title": 7, "description": "D", "image": "a.png"}]
+
+    report = asyncio.run(import_archive(make_archive(manifest), created_by="u"))
+
+    statuses = {(r["key"], r["status"]) for r in report["items"]}
+    assert ("one", "imported") in statuses
+    assert [r["key"] for r in report["items"] if r["status"] == "failed"].count("one") == 1
+    assert (report["total"], report["imported"], report["failed"]) == (6, 1, 5)
+    assert asyncio.run(mongo_db.templates.count_documents({})) == 1
+    assert len(storage.images) == 1
+
+def test_rerun_skips_imported_items(mongo_db, storage):
+    manifest = [{"key": "one", "title": "T", "description": "D", "image": "a.png"}]
+    asyncio.run(import_archive(make_archive(manifest), created_by="u", job_id="job"))
+    report = asyncio.run(import_archive(make_archive(manifest), created_by="u", job_id="job"))
+    assert (report["imported"], report["skipped"]) == (0, 1)
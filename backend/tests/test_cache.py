@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import cache
+from app.core.cache import TTLCache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Only the cache module sees the fake clock; the event loop keeps the real one
+    fake = Clock()
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=fake.monotonic))
+    return fake
+
+def test_get_set_and_counters(clock):
+    c = TTLCache(10, ttl=60)
+    assert c.get("a") is None
+    c.set("a", 1)
+    assert c.get("a") == 1
+    assert (c.hits, c.misses) == (1, 1)
+
+def test_entries_expire(clock):
+    c = TTLCache(10, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2, ttl=120)
+    clock.now += 60
+    assert c.peek("a") is None
+    assert c.get("a") is None
+    assert c.get("b") == 2
+    assert c.expirations == 1
+
+def test_lru_eviction_by_size(clock):
+    c = TTLCache(10, ttl=60, sizer=len)
+    c.set("a", b"xxxx")
+    c.set("b", b"xxxx")
+    c.get("a")
+    c.set("c", b"xxxx")
+    assert c.keys() == ["a", "c"]
+    assert c.stats()["size"] == 8
+    assert c.evictions == 1
+    # Entries larger than the whole budget are not stored
+    c.set("d", b"x" * 11)
+    assert c.peek("d") is None
+
+def test_get_or_load_coalesces_concurrent_misses():
+    c = TTLCache(10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*[c.get_or_load("k", loader) for _ in range(5)])
+
+    assert asyncio.run(run()) == ["value"] * 5
+    assert len(calls) == 1
+    assert c.coalesced == 4
+    assert c.peek("k") == "value"
+
+def test_get_or_load_does_not_cache_none_or_errors():
+    c = TTLCache(10, ttl=60)
+
+    async def missing():
+        return None
+
+    async def failing():
+        raise RuntimeError("down")
+
+    async def run():
+        assert await c.get_or_load("k", missing) is None
+        with pytest.raises(RuntimeError):
+            await c.get_or_load("k", failing)
+
+    asyncio.run(run())
+    assert c.keys() == []
+    assert c.stats()["inflight"] == 0
+
+def test_invalidate_during_load_keeps_stale_value_out():
+    c = TTLCache(10, ttl=60)
+
+    async def run():
+        started = asyncio.Event()
+
+        async def loader():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "stale"
+
+        task = asyncio.ensure_future(c.get_or_load("k", loader))
+        await started.wait()
+        c.invalidate("k")
+        assert await task == "stale"
+
+    asyncio.run(run())
+    assert c.peek("k") is None
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from app.core import cache_invalidation
+from app.core.cache import image_cache
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = list(events)
+        self.resume_token = None
+
+    @property
+    def alive(self):
+        return bool(self.events)
+
+    async def try_next(self):
+        change = self.events.pop(0)
+        self.resume_token = {"_data": change["_id"]}
+        return change
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+class FakeDatabase:
+    def __init__(self, *streams, error=None):
+        self.streams = list(streams)
+        self.error = error
+        self.resumed_after = []
+
+    def watch(self, pipeline, resume_after=None, **kwargs):
+        self.resumed_after.append(resume_after)
+        if self.error is not None and resume_after is not None:
+            raise self.error
+        return self.streams.pop(0)
+
+def image_delete(event_id: str, image_id: ObjectId) -> dict:
+    return {"_id": event_id, "operationType": "delete", "ns": {"coll": "image_files.files"}, "documentKey": {"_id": image_id}}
+
+@pytest.fixture
+def reconciles(monkeypatch):
+    calls = []
+
+    async def reconcile_images(db):
+        calls.append(db)
+
+    monkeypatch.setattr(cache_invalidation, "reconcile_images", reconcile_images)
+    monkeypatch.setattr(cache_invalidation, "_resume_token", None)
+    return calls
+
+def test_fresh_stream_reconciles_and_resumes_in_process(reconciles):
+    image_id = ObjectId()
+    image_cache.set(str(image_id), {"file_doc": {"_id": image_id}, "data": b"x"})
+    db = FakeDatabase(FakeStream([image_delete("1", image_id)]), FakeStream([]))
+
+    asyncio.run(cache_invalidation.watch_changes(db))
+    assert image_cache.peek(str(image_id)) is None
+    assert reconciles == [db]
+
+    # A reconnect in the same process resumes after the last event without reconciling
+    asyncio.run(cache_invalidation.watch_changes(db))
+    assert db.resumed_after == [None, {"_data": "1"}]
+    assert reconciles == [db]
+
+def test_lost_history_invalidates_everything(reconciles, monkeypatch):
+    invalidated = []
+
+    async def invalidate_all():
+        invalidated.append(True)
+
+    monkeypatch.setattr(cache_invalidation, "invalidate_all", invalidate_all)
+    monkeypatch.setattr(cache_invalidation, "_resume_token", {"_data": "old"})
+    db = FakeDatabase(error=OperationFailure("history lost", code=cache_invalidation.CHANGE_STREAM_HISTORY_LOST))
+
+    asyncio.run(cache_invalidation.watch_changes(db))
+    assert invalidated == [True]
+    assert cache_invalidation._resume_token is None
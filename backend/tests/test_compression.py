@@ -0,0 +1,53 @@
+import gzip
+
+import pytest
+
+from app.core import compression
+from app.core.compression import is_compressible, negotiate, precompress
+
+@pytest.fixture(autouse=True)
+def compression_settings(monkeypatch):
+    # Independent of a local .env
+    monkeypatch.setattr(compression, "COMPRESSION_ENABLED", True)
+    monkeypatch.setattr(compression, "COMPRESSION_MIN_BYTES", 1024)
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("GZIP, deflate", "gzip"),
+    ("br, gzip", "br"),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.1, br;q=0", "gzip"),
+    ("identity", None),
+    ("gzip;q=abc", None),
+])
+def test_negotiate(accept_encoding, expected):
+    assert negotiate(accept_encoding, ("br", "gzip")) == expected
+
+def test_negotiate_only_offers_available_codings():
+    assert negotiate("br", ("gzip",)) is None
+    assert negotiate("br, gzip", ("gzip",)) == "gzip"
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("application/json", True),
+    ("text/html; charset=utf-8", True),
+    ("image/svg+xml", True),
+    ("image/png", False),
+    ("application/zip", False),
+    (None, False),
+])
+def test_is_compressible(content_type, expected):
+    assert is_compressible(content_type) is expected
+
+def test_precompress_skips_small_bodies():
+    assert precompress(b"{}") == {"identity": b"{}"}
+
+def test_precompress_variants_decode_to_the_body():
+    body = b'{"title":"template"}' * 200
+    variants = precompress(body)
+    assert variants["identity"] == body
+    assert gzip.decompress(variants["gzip"]) == body
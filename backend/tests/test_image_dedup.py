@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from gridfs.errors import NoFile
+
+from app.core import database
+from app.core.database import IMAGE_BUCKET_NAME, release_image, store_image_content
+
+class MemoryBucket:
+    """The part of AsyncIOMotorGridFSBucket the image store uses, yielding like network I/O"""
+
+    def __init__(self, db):
+        self.files = db[f"{IMAGE_BUCKET_NAME}.files"]
+        self.blobs = {}
+
+    async def upload_from_stream(self, filename, data, metadata=None):
+        file_id = ObjectId()
+        await asyncio.sleep(0)
+        self.blobs[file_id] = bytes(data)
+        await self.files.insert_one({"_id": file_id, "filename": filename, "length": len(data), "metadata": metadata})
+        return file_id
+
+    async def delete(self, file_id):
+        await asyncio.sleep(0)
+        self.blobs.pop(file_id, None)
+        if not (await self.files.delete_one({"_id": file_id})).deleted_count:
+            raise NoFile(file_id)
+
+@pytest.fixture
+def bucket(mongo_db, monkeypatch):
+    asyncio.run(mongo_db[f"{IMAGE_BUCKET_NAME}.files"].create_index(
+        [("metadata.sha256", 1)],
+        unique=True,
+        partialFilterExpression={"metadata.refcount": {"$exists": True}}
+    ))
+    memory_bucket = MemoryBucket(mongo_db)
+
+    async def get_image_bucket():
+        return memory_bucket
+
+    monkeypatch.setattr(database, "get_image_bucket", get_image_bucket)
+    return memory_bucket
+
+def test_concurrent_identical_uploads_share_one_original(bucket):
+    async def run():
+        return await asyncio.gather(*[store_image_content(b"same bytes", "a.png") for _ in range(2)])
+
+    (first_id, _), (second_id, _) = asyncio.run(run())
+    assert first_id == second_id
+    assert list(bucket.blobs) == [first_id]
+    doc = asyncio.run(bucket.files.find_one({"_id": first_id}))
+    assert doc["metadata"]["refcount"] == 2
+
+def test_released_original_is_deleted_with_its_last_reference(bucket):
+    image_id, created = asyncio.run(store_image_content(b"bytes", "a.png"))
+    assert created
+    assert asyncio.run(store_image_content(b"bytes", "b.png")) == (image_id, False)
+    assert asyncio.run(release_image(image_id)) is False
+    assert asyncio.run(release_image(image_id)) is True
+    assert bucket.blobs == {}
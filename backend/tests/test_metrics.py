@@ -0,0 +1,30 @@
+from pymongo import monitoring
+
+from app.core.metrics import mongo_pool_metrics, mongo_pool_stats
+
+ADDRESS = ("localhost", 27017)
+
+def test_pool_events_reach_the_prometheus_metrics():
+    # The registry is process wide, so compare against the values before the events
+    before = mongo_pool_stats()
+
+    mongo_pool_metrics.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 1))
+    mongo_pool_metrics.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 2))
+    mongo_pool_metrics.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, 1, 0.002))
+    mongo_pool_metrics.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, 2, 0.3))
+    mongo_pool_metrics.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDRESS, 2))
+    mongo_pool_metrics.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(ADDRESS, "timeout", 1.0))
+    mongo_pool_metrics.connection_closed(monitoring.ConnectionClosedEvent(ADDRESS, 2, "idle"))
+
+    after = mongo_pool_stats()
+    assert after["connections_open"] - before["connections_open"] == 1
+    assert after["connections_in_use"] - before["connections_in_use"] == 1
+    assert after["checkouts"] - before["checkouts"] == 2
+    assert after["checkout_failures"]["timeout"] - before["checkout_failures"].get("timeout", 0) == 1
+
+    def bucket(stats, le):
+        return stats["checkout_wait_buckets"].get(f"le_{le}", 0)
+
+    assert bucket(after, "0.005") - bucket(before, "0.005") == 1
+    assert bucket(after, "0.5") - bucket(before, "0.5") == 2
+    assert bucket(after, "+Inf") - bucket(before, "+Inf") == 2
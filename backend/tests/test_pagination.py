@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.utils.pagination import (
+    TEMPLATE_FIELDS,
+    build_projection,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    parse_fields,
+)
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    doc_id = ObjectId()
+    cursor = encode_cursor(created_at, doc_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, doc_id)
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", encode_cursor(datetime(2024, 1, 1), ObjectId())[:-4]])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+def test_keyset_filter_resumes_after_cursor():
+    created_at, doc_id = datetime(2024, 5, 1), ObjectId()
+    assert keyset_filter(None) == {}
+    assert keyset_filter(encode_cursor(created_at, doc_id)) == {
+        "$or": [
+            {"created_at": {"$gt": created_at}},
+            {"created_at": created_at, "_id": {"$gt": doc_id}},
+        ]
+    }
+
+def test_parse_fields():
+    assert parse_fields(None) == TEMPLATE_FIELDS
+    assert parse_fields("title, _id,title") == ("title", "id")
+    with pytest.raises(HTTPException):
+        parse_fields("title,password")
+    with pytest.raises(HTTPException):
+        parse_fields(",")
+
+def test_build_projection_keeps_keyset_columns():
+    projection = build_projection(("title",))
+    assert projection["title"] == 1
+    assert projection["created_at"] == 1
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from starlette.datastructures import Headers
+
+from app.core import rate_limit
+from app.core.rate_limit import MemoryRateLimitBackend, client_ip, parse_budget, route_class
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Only the rate limit module sees the fake clock; the event loop keeps the real one
+    fake = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=fake.monotonic))
+    return fake
+
+@pytest.mark.parametrize("budget, expected", [
+    ("10/minute", (10, 10 / 60)),
+    ("1/second", (1, 1.0)),
+    ("5/hour", (5, 5 / 3600)),
+])
+def test_parse_budget(budget, expected):
+    assert parse_budget(budget) == expected
+
+@pytest.mark.parametrize("budget", ["10", "10/day", "0/minute", "-1/minute", "ten/minute", "/minute"])
+def test_parse_budget_rejects_invalid(budget):
+    with pytest.raises(ValueError):
+        parse_budget(budget)
+
+def take(backend, key, capacity=3, rate=1.0):
+    return asyncio.run(backend.take(key, capacity, rate))
+
+def test_bucket_allows_a_burst_then_limits(clock):
+    backend = MemoryRateLimitBackend()
+    assert [take(backend, "a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert take(backend, "a") == pytest.approx(1.0)
+    # Other clients have their own bucket
+    assert take(backend, "b") == 0.0
+
+def test_bucket_refills_over_time(clock):
+    backend = MemoryRateLimitBackend()
+    for _ in range(3):
+        take(backend, "a")
+    clock.now += 0.5
+    assert take(backend, "a") == pytest.approx(0.5)
+    clock.now += 0.5
+    assert take(backend, "a") == 0.0
+    # Refill never exceeds the capacity
+    clock.now += 3600
+    assert [take(backend, "a") for _ in range(4)][-1] > 0
+
+def test_bucket_keys_are_bounded(clock):
+    backend = MemoryRateLimitBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        take(backend, key)
+    assert list(backend._buckets) == ["b", "c"]
+
+def test_client_ip_ignores_forwarded_header_by_default(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", False)
+    headers = Headers({"x-forwarded-for": "1.1.1.1"})
+    assert client_ip(headers, ("10.0.0.1", 1234)) == "10.0.0.1"
+    assert client_ip(Headers({}), None) == "unknown"
+
+@pytest.mark.parametrize("hops, expected", [(1, "3.3.3.3"), (2, "2.2.2.2"), (5, "1.1.1.1")])
+def test_client_ip_uses_the_address_added_by_the_trusted_proxy(monkeypatch, hops, expected):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_FORWARDED", True)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_PROXY_HOPS", hops)
+    headers = Headers({"x-forwarded-for": "1.1.1.1, 2.2.2.2,3.3.3.3"})
+    assert client_ip(headers, ("10.0.0.1", 1234)) == expected
+
+@pytest.mark.parametrize("method, path, expected", [
+    ("POST", "/api/auth/login", "auth"),
+    ("POST", "/api/templates", "uploads"),
+    ("PUT", "/api/templates/abc", "uploads"),
+    ("GET", "/api/templates/", "reads"),
+    ("HEAD", "/api/images/abc", "reads"),
+    ("DELETE", "/api/templates/abc", None),
+    # Probes, scrapes and diagnostics must answer while reads are saturated
+    ("GET", "/api/health", None),
+    ("HEAD", "/api/health", None),
+    ("GET", "/metrics", None),
+    ("GET", "/api/cache/stats", None),
+    ("GET", "/api/limits", None),
+    ("GET", "/api/db/pool", None),
+    ("GET", "/api/profiles", None),
+    ("GET", "/api/profiles/abc", None),
+])
+def test_route_class(method, path, expected):
+    assert route_class(method, path) == expected
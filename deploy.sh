@@ -63,6 +63,7 @@ echo "   - BASE_URL: https://your-backend-service-name.onrender.com"
 echo "   - CLOUDINARY_CLOUD_NAME: (your Cloudinary cloud name)"
 echo "   - CLOUDINARY_API_KEY: (your Cloudinary API key)"
 echo "   - CLOUDINARY_API_SECRET: (your Cloudinary API secret)"
+echo "   - RATE_LIMIT_TRUST_FORWARDED: true"
 echo ""
 
 echo "🌐 FRONTEND DEPLOYMENT (Vercel):"
@@ -5,11 +5,12 @@ import Loading from "../components/Loading";
 import ErrorMessage from "../components/ErrorMessage";
 import { useScreenshotDetection } from "../hooks/useScreenshotDetection";
 import { useNavigate } from "react-router-dom";
+import { imageVariantUrl } from "../services/api";
 
 const TemplateList: React.FC = () => {
   const dispatch = useAppDispatch();
   const navigate = useNavigate();
-  const { templates, loading, error } = useAppSelector(
+  const { templates, nextCursor, loading, error } = useAppSelector(
     (state) => state.templates
   );
   useScreenshotDetection(); // Hook to detect screenshots
@@ -40,7 +41,7 @@ const TemplateList: React.FC = () => {
               className="bg-white border border-gray-200 rounded-lg shadow-sm overflow-hidden"
             >
               <img
-                src={template.image_url}
+                src={imageVariantUrl(template.image_url, "thumbnail")}
                 alt={template.title}
                 className="w-full h-48 object-cover"
               />
@@ -61,6 +62,17 @@ const TemplateList: React.FC = () => {
             </div>
           ))}
         </div>
+
+        {nextCursor && !loading && (
+          <div className="mt-8 flex justify-center">
+            <button
+              onClick={() => dispatch(fetchTemplates(nextCursor))}
+              className="bg-white hover:bg-gray-50 text-gray-700 text-sm font-medium py-2 px-4 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-primary-500"
+            >
+              Load more
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
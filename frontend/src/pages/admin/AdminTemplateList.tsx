@@ -3,10 +3,11 @@ import { useAppDispatch, useAppSelector } from '../../hooks/redux';
 import { fetchTemplates, deleteTemplate } from '../../store/templateSlice';
 import Loading from '../../components/Loading';
 import ErrorMessage from '../../components/ErrorMessage';
+import { imageVariantUrl } from '../../services/api';
 
 const AdminTemplateList: React.FC = () => {
   const dispatch = useAppDispatch();
-  const { templates, loading, error } = useAppSelector((state) => state.templates);
+  const { templates, nextCursor, loading, error } = useAppSelector((state) => state.templates);
 
   useEffect(() => {
     dispatch(fetchTemplates());
@@ -36,7 +37,7 @@ const AdminTemplateList: React.FC = () => {
               className="bg-white border border-gray-200 rounded-lg shadow-sm overflow-hidden"
             >
               <img
-                src={template.image_url}
+                src={imageVariantUrl(template.image_url, 'thumbnail')}
                 alt={template.title}
                 className="w-full h-48 object-cover"
               />
@@ -58,6 +59,17 @@ const AdminTemplateList: React.FC = () => {
             </div>
           ))}
         </div>
+
+        {nextCursor && !loading && (
+          <div className='mt-8 flex justify-center'>
+            <button
+              onClick={() => dispatch(fetchTemplates(nextCursor))}
+              className='bg-white hover:bg-gray-50 text-gray-700 text-sm font-medium py-2 px-4 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-primary-500'
+            >
+              Load more
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1,7 +1,8 @@
 import axios, { AxiosResponse } from 'axios';
-import { LoginCredentials, RegisterData, CreateTemplateData, ApiResponse, LoginResponse, Template } from '../types';
+import { LoginCredentials, RegisterData, CreateTemplateData, ApiResponse, LoginResponse, Template, TemplatePage } from '../types';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000/api';
+const TEMPLATE_PAGE_SIZE = 50;
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -50,9 +51,15 @@ export const authAPI = {
 };
 
 export const templateAPI = {
-  getAll: async (): Promise<Template[]> => {
-    const response: AxiosResponse<Template[]> = await api.get('/templates');
-    return response.data;
+  getPage: async (cursor?: string): Promise<TemplatePage> => {
+    // The list endpoint is keyset paginated; X-Next-Cursor is absent on the last page
+    const response: AxiosResponse<Template[]> = await api.get('/templates', {
+      params: { limit: TEMPLATE_PAGE_SIZE, cursor },
+    });
+    return {
+      templates: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    };
   },
 
   getById: async (id: string): Promise<Template> => {
@@ -94,4 +101,8 @@ export const templateAPI = {
   },
 };
 
+// Images served by the API can be requested as smaller WebP variants (thumbnail, medium, webp)
+export const imageVariantUrl = (url: string, variant: string): string =>
+  url && url.includes('/api/images/') ? `${url}?variant=${variant}` : url;
+
 export default api;
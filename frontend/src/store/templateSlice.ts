@@ -4,18 +4,19 @@ import { templateAPI } from '../services/api';
 
 const initialState: TemplateState = {
   templates: [],
+  nextCursor: null,
   selectedTemplate: null,
   loading: false,
   error: null,
 };
 
 // Async thunks
+// Without a cursor the first page replaces the list; with one the page is appended
 export const fetchTemplates = createAsyncThunk(
-  'templates/fetchAll',
-  async (_, { rejectWithValue }) => {
+  'templates/fetchPage',
+  async (cursor: string | undefined, { rejectWithValue }) => {
     try {
-      const templates = await templateAPI.getAll();
-      return templates;
+      return await templateAPI.getPage(cursor);
     } catch (error: any) {
       return rejectWithValue(
         error.response?.data?.detail || 'Failed to fetch templates'
@@ -106,7 +107,10 @@ const templateSlice = createSlice({
       })
       .addCase(fetchTemplates.fulfilled, (state, action) => {
         state.loading = false;
-        state.templates = action.payload;
+        state.templates = action.meta.arg
+          ? [...state.templates, ...action.payload.templates]
+          : action.payload.templates;
+        state.nextCursor = action.payload.nextCursor;
         state.error = null;
       })
       .addCase(fetchTemplates.rejected, (state, action) => {
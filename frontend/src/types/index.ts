@@ -16,6 +16,11 @@ export interface Template {
   updated_at: string;
 }
 
+export interface TemplatePage {
+  templates: Template[];
+  nextCursor: string | null;
+}
+
 export interface AuthState {
   user: User | null;
   token: string | null;
@@ -26,6 +31,7 @@ export interface AuthState {
 
 export interface TemplateState {
   templates: Template[];
+  nextCursor: string | null;
   selectedTemplate: Template | null;
   loading: boolean;
   error: string | null;